@@ -42,7 +42,7 @@ prog.addLivenessValuesToGraph()
 
 # total cycles = sum of all the frequencies
 total_cycles = sum(
-    [inst.freq for bb in prog.basicBlocks for inst in bb.bbInstructions()]
+    [prog.frequencies[pc] for bb in prog.basicBlocks for pc in bb.bbPCs()]
 )
 
 new_instructions = []
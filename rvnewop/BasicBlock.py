@@ -4,20 +4,26 @@ import networkx as nx
 class BasicBlock:
     """A class that contains the beginning and end of basic blocks"""
 
-    def __init__(self, name, start, end, freq, instructions):
+    def __init__(self, name, start, end, freq, instructions, frequencies=None):
         """The start and end values are the pc values
         for the basic block begins and ends.
         freq is the count of how many times the block
         was executed.
         instructions is a dictionary of decoded instructions
-        keyed by PC values."""
+        keyed by PC values.
+        frequencies is a dictionary of instruction frequencies
+        keyed by PC values, if not given every instruction is
+        taken to have executed freq times."""
 
         self.name = name
         self.start = start
         self.end = end
         self.frequency = freq
         self.instructions = instructions
+        self.frequencies = frequencies
         self.sub_blocks = []
+        # the DAG of the block, see getDAG
+        self.dag = None
 
     def genSubBlocks(self):
         """Generate subblocks within existing basic block
@@ -43,6 +49,7 @@ class BasicBlock:
                             pc,
                             self.frequency,
                             self.instructions,
+                            self.frequencies,
                         )
                     )
                     idx += 1
@@ -59,6 +66,7 @@ class BasicBlock:
                                 l_pc,
                                 self.frequency,
                                 self.instructions,
+                                self.frequencies,
                             )
                         )
                         idx += 1
@@ -78,6 +86,7 @@ class BasicBlock:
                                 l_pc,
                                 self.frequency,
                                 self.instructions,
+                                self.frequencies,
                             )
                         )
                         idx += 1
@@ -96,6 +105,7 @@ class BasicBlock:
                         l_pc,
                         self.frequency,
                         self.instructions,
+                        self.frequencies,
                     )
                 )
                 idx += 1
@@ -104,6 +114,12 @@ class BasicBlock:
         print(self.name + ": Start PC: " + hex(self.start))
         print(self.name + ": End PC: " + hex(self.end))
 
+    def getFrequency(self, pc):
+        """Returns how many times the instruction at pc was executed"""
+        if self.frequencies is None:
+            return self.frequency
+        return self.frequencies[pc]
+
     def bbPCs(self):
         """A generator to loop through *only* the PC values
         contained in a basic block."""
@@ -176,16 +192,20 @@ class BasicBlock:
         graph.add_nodes_from(registers, type="register")
         graph.add_nodes_from(constants, type="constant")
 
-        for inst in self.bbInstructions():
-            if not inst.dest_registers or inst.isControlTransfer():
+        for pc in self.bbPCs():
+            inst = self.instructions[pc]
+            if not inst.writesRd() or inst.isControlTransfer():
                 # no dest registers or control transfer, skip
                 continue
             else:
-                pc = list(self.instructions.keys())[
-                    list(self.instructions.values()).index(inst)
-                ]
                 node = str(hex(pc)) + ": " + str(inst)
-                graph.add_node(node, type="instruction", instruction=inst, pc=pc)
+                graph.add_node(
+                    node,
+                    type="instruction",
+                    instruction=inst,
+                    pc=pc,
+                    freq=self.getFrequency(pc),
+                )
                 for s in inst.src_registers:
                     graph.add_edge(node, current_node[s])
 
@@ -200,3 +220,19 @@ class BasicBlock:
         if graph.number_of_nodes == 0:
             return None
         return graph
+
+    def getDAG(self):
+        """Returns the DAG of the block (see constructDAG), it is only
+        constructed the first time and kept so Program.updateFrequencies
+        can update its frequencies"""
+        if self.dag is None:
+            self.dag = self.constructDAG()
+        return self.dag
+
+    def updateDAGFrequencies(self):
+        """Sets the frequencies in the kept DAG to the current ones"""
+        if self.dag is None:
+            return
+        for node, data in self.dag.nodes(data=True):
+            if data["type"] == "instruction":
+                data["freq"] = self.getFrequency(data["pc"])
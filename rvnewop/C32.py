@@ -1,3 +1,6 @@
+import pickle
+from os import path
+
 from bitarray import bitarray, frozenbitarray
 from bitarray.util import zeros
 
@@ -196,7 +199,7 @@ class C32:
                 imm = fp.immToInt(nzimm)
 
                 if data["register"] == "x0":
-                    raise Exception("C.LUI cannot have a destination register of x0")
+                    raise ValueError("C.LUI cannot have a destination register of x0")
                 if imm == 0:
                     return RVInstruction(rv_name="reserved", rv_size=16)
 
@@ -477,12 +480,334 @@ class C32:
             # C.FSWSP, not implemented here
             pass
 
+    # Integer decoders
+    # These mirror the bitarray decoders above but work on the instruction
+    # word as a plain int, see RV32.decodeInt
+
+    # funct2 --> instruction name
+    CB_NAMES = ("c.srli", "c.srai", "c.andi")
+    CA_NAMES = ("c.sub", "c.xor", "c.or", "c.and")
+
+    @staticmethod
+    def getCJImm_int(word):
+        """Returns the sign extended jump offset of a CJ format instruction word"""
+        return fp.twos_compliment(
+            (word >> 1 & 0x800)  # 11
+            | (word << 2 & 0x400)  # 10
+            | (word >> 1 & 0x300)  # 9:8
+            | (word << 1 & 0x80)  # 7
+            | (word >> 1 & 0x40)  # 6
+            | (word << 3 & 0x20)  # 5
+            | (word >> 7 & 0x10)  # 4
+            | (word >> 2 & 0xE),  # 3:1
+            12,
+        )
+
+    @staticmethod
+    def getCBImm_int(word):
+        """Returns the sign extended branch offset of a CB format instruction word"""
+        return fp.twos_compliment(
+            (word >> 4 & 0x100)  # 8
+            | (word << 1 & 0xC0)  # 7:6
+            | (word << 3 & 0x20)  # 5
+            | (word >> 7 & 0x18)  # 4:3
+            | (word >> 2 & 0x6),  # 2:1
+            9,
+        )
+
+    @staticmethod
+    def getCIImm_int(word):
+        """Returns the sign extended 6 bit immediate of a CI format instruction word"""
+        return fp.twos_compliment((word >> 7 & 0x20) | (word >> 2 & 0x1F), 6)
+
+    @staticmethod
+    def QUADRANT_0_int(word):
+        if word == 0:
+            # illegal instructions are all 0s
+            return RVInstruction(rv_name="illegal", rv_size=16)
+
+        f3 = fp.getCFunct3_int(word)
+
+        if f3 == 0b000:
+            # C.ADDI4SPN
+            imm = (
+                (word >> 3 & 0xF0)  # 9:6
+                | (word >> 9 & 0xC)  # 5:4
+                | (word >> 4 & 0x2)  # 3
+                | (word >> 6 & 0x1)  # 2
+            )
+            return RVInstruction.fromIds(
+                "CIW",
+                "c.addi4spn",
+                16,
+                word,
+                (2,),
+                (8 + (word >> 2 & 0x7),),
+                (fp.twos_compliment(imm, 8) * 4,),
+            )
+
+        elif f3 == 0b010 or f3 == 0b110:
+            # C.LW and C.SW
+            imm = fp.twos_compliment(
+                (word >> 1 & 0x10)  # 6
+                | (word >> 9 & 0xE)  # 5:3
+                | (word >> 6 & 0x1),  # 2
+                5,
+            )
+            rs1 = 8 + (word >> 7 & 0x7)
+            rd_rs2 = 8 + (word >> 2 & 0x7)
+
+            if f3 == 0b010:
+                return RVInstruction.fromIds(
+                    "CL", "c.lw", 16, word, (rs1,), (rd_rs2,), (imm * 4,)
+                )
+            return RVInstruction.fromIds(
+                "CS", "c.sw", 16, word, (rs1, rd_rs2), (), (imm * 4,)
+            )
+
+        elif f3 == 0b100:
+            return RVInstruction(rv_name="reserved", rv_size=16)
+
+        # C.FLD, C.FLW, C.FSD and C.FSW are not implemented
+
+    @staticmethod
+    def QUADRANT_1_int(word):
+        f3 = fp.getCFunct3_int(word)
+        register = word >> 7 & 0x1F
+
+        if f3 == 0b000:
+            # C.ADDI, the source does not show up in output
+            return RVInstruction.fromIds(
+                "CI",
+                "c.addi",
+                16,
+                word,
+                (register,),
+                (register,),
+                (C32.getCIImm_int(word),),
+            )
+
+        elif f3 == 0b001 or f3 == 0b101:
+            # C.JAL and C.J
+            return RVInstruction.fromIds(
+                "CJ",
+                "c.jal" if f3 == 0b001 else "c.j",
+                16,
+                word,
+                (),
+                (1 if f3 == 0b001 else 0,),
+                (C32.getCJImm_int(word),),
+            )
+
+        elif f3 == 0b010:
+            # C.LI
+            return RVInstruction.fromIds(
+                "CI", "c.li", 16, word, (), (register,), (C32.getCIImm_int(word),)
+            )
+
+        elif f3 == 0b011:
+            if register == 2:
+                # C.ADDI16SP
+                nzimm = fp.twos_compliment(
+                    (word >> 7 & 0x20)  # 9
+                    | (word & 0x18)  # 8:7
+                    | (word >> 3 & 0x4)  # 6
+                    | (word >> 1 & 0x2)  # 5
+                    | (word >> 6 & 0x1),  # 4
+                    6,
+                )
+                return RVInstruction.fromIds(
+                    "CI",
+                    "c.addi16sp",
+                    16,
+                    word,
+                    (2,),
+                    (2,),
+                    (nzimm * 16,),  # left shift by 4
+                )
+
+            # C.LUI
+            imm = C32.getCIImm_int(word) << 12
+
+            if register == 0:
+                raise ValueError("C.LUI cannot have a destination register of x0")
+            if imm == 0:
+                return RVInstruction(rv_name="reserved", rv_size=16)
+
+            return RVInstruction.fromIds(
+                "CI", "c.lui", 16, word, (), (register,), (imm,)
+            )
+
+        elif f3 == 0b100:
+            f2 = word >> 10 & 0x3
+            rs1 = 8 + (word >> 7 & 0x7)
+
+            if f2 == 0b11:
+                # C.SUB, C.XOR, C.OR, and C.AND
+                return RVInstruction.fromIds(
+                    "CA",
+                    C32.CA_NAMES[word >> 5 & 0x3],
+                    16,
+                    word,
+                    (rs1, 8 + (word >> 2 & 0x7)),
+                    (rs1,),
+                )
+
+            # C.SRLI, C.SRAI and C.ANDI
+            return RVInstruction.fromIds(
+                "CB",
+                C32.CB_NAMES[f2],
+                16,
+                word,
+                (rs1,),
+                (rs1,),
+                (C32.getCIImm_int(word),),
+            )
+
+        else:
+            # C.BEQZ and C.BNEZ
+            return RVInstruction.fromIds(
+                "CB",
+                "c.beqz" if f3 == 0b110 else "c.bnez",
+                16,
+                word,
+                (8 + (word >> 7 & 0x7),),
+                (),
+                (C32.getCBImm_int(word),),
+            )
+
+    @staticmethod
+    def QUADRANT_2_int(word):
+        f3 = fp.getCFunct3_int(word)
+        register = word >> 7 & 0x1F
+        rs2 = word >> 2 & 0x1F
+
+        if f3 == 0b000:
+            # C.SLLI
+            return RVInstruction.fromIds(
+                "CI",
+                "c.slli",
+                16,
+                word,
+                (register,),
+                (register,),
+                (C32.getCIImm_int(word),),
+            )
+
+        elif f3 == 0b010:
+            # C.LWSP
+            imm = fp.twos_compliment(
+                (word << 4 & 0xC0)  # 7:6
+                | (word >> 7 & 0x20)  # 5
+                | (word >> 2 & 0x1C),  # 4:2
+                8,
+            )
+            return RVInstruction.fromIds(
+                "CI", "c.lwsp", 16, word, (2,), (register,), (imm,)
+            )
+
+        elif f3 == 0b100:
+            # C.JR, C.MV, C.EBREAK, C.JALR, and C.ADD
+            if word >> 12 & 1 == 0:
+                if rs2 == 0:
+                    # C.JR
+                    return RVInstruction.fromIds("CR", "c.jr", 16, word, (register,))
+                # C.MV
+                return RVInstruction.fromIds(
+                    "CR", "c.mv", 16, word, (rs2,), (register,)
+                )
+
+            if rs2 == 0 and register == 0:
+                # C.EBREAK
+                return RVInstruction.fromIds("CR", "c.ebreak", 16, word)
+            elif rs2 == 0:
+                # C.JALR
+                return RVInstruction.fromIds(
+                    "CR", "c.jalr", 16, word, (register,), (1,)
+                )
+            # C.ADD
+            return RVInstruction.fromIds(
+                "CR", "c.add", 16, word, (register, rs2), (register,)
+            )
+
+        elif f3 == 0b110:
+            # C.SWSP
+            # offset[7:6] is in bits 8:7 and offset[5:2] in bits 12:9
+            offset = fp.twos_compliment((word >> 1 & 0xC0) | (word >> 7 & 0x3C), 8)
+            return RVInstruction.fromIds(
+                "CR", "c.swsp", 16, word, (rs2,), (), (offset,)
+            )
+
+        # C.FLDSP, C.FLWSP, C.FSDSP and C.FSWSP are not implemented
+
     instructionTable = {
         frozenbitarray("00"): QUADRANT_0.__func__,
         frozenbitarray("01"): QUADRANT_1.__func__,
         frozenbitarray("10"): QUADRANT_2.__func__,
     }
 
+    intInstructionTable = {
+        0b00: QUADRANT_0_int.__func__,
+        0b01: QUADRANT_1_int.__func__,
+        0b10: QUADRANT_2_int.__func__,
+    }
+
+    # dense decode table, see getDecodeTable
+    decodeTable = None
+
+    @staticmethod
+    def buildDecodeTable():
+        """Decodes every 16bit encoding up front
+
+        Returns a list indexed by the raw 16bit word holding the RVInstruction
+        for that encoding (None if it has none). Encodings whose decoder raises
+        hold False so the caller can decode them again to get the exception,
+        32bit encodings (ending in 11) hold None"""
+        table = [None] * 0x10000
+        for word in range(0x10000):
+            f = C32.intInstructionTable.get(word & 0b11)
+            if f is None:
+                continue
+            try:
+                table[word] = f(word)
+            except Exception:
+                table[word] = False
+        return table
+
+    @staticmethod
+    def getDecodeTable(filename=None):
+        """Returns the dense decode table, building it once per process
+
+        The RVInstructions in it are shared and must not be modified.
+        If filename is given the table is loaded from it when it holds a table
+        for this version of rvnewop and RVInstruction layout, otherwise the table is built and saved there
+        (replacing a stale or unreadable file)"""
+        if C32.decodeTable is not None:
+            return C32.decodeTable
+
+        from . import __version__
+
+        if filename is not None and path.exists(filename):
+            try:
+                with open(filename, "rb") as infile:
+                    version, slots, table = pickle.load(infile)
+            except Exception:
+                # written by an rvnewop whose RVInstruction no longer loads
+                version = None
+            if version == __version__ and slots == RVInstruction.__slots__:
+                C32.decodeTable = table
+                return table
+
+        C32.decodeTable = C32.buildDecodeTable()
+        if filename is not None:
+            with open(filename, "wb") as outfile:
+                pickle.dump(
+                    (__version__, RVInstruction.__slots__, C32.decodeTable),
+                    outfile,
+                    protocol=pickle.HIGHEST_PROTOCOL,
+                )
+        return C32.decodeTable
+
     instructionNameSet = {
         "c.addi4spn",
         "c.lw",
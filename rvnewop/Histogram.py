@@ -1,25 +1,683 @@
+import bz2
+import functools
+import gzip
+import heapq
+import io
+import itertools
+import lzma
+import mmap
+import os
+import struct
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
 from .Program import Program
+from .RV32 import RV32
+from .RVInstruction import RVInstruction
+from .ProgramCache import ProgramCache
 
 
 class Histogram:
     """A Class to help parse .hst Histogram files and convert them into programs"""
 
+    # the line ending the header of a .hst file, the records follow it
+    headerEnd = "PC Histogram size:"
+
+    # bytes of text parseArrays works on at once
+    chunkSize = 1 << 22
+
+    # records converted between arrays and tuples at once
+    batchSize = 1 << 16
+
+    # bytes read from histogram files at once
+    readBufferSize = 1 << 20
+
+    # magic bytes --> module that decompresses histograms starting with them
+    compressions = {b"\x1f\x8b": gzip, b"\xfd7zXZ\x00": lzma, b"BZh": bz2}
+
+    # suffixes of compressed histograms
+    compressedSuffixes = (".gz", ".xz", ".bz2")
+
+    # file names of histograms, see findFiles
+    fileSuffixes = (".hst", ".hst.gz", ".hst.xz", ".hst.bz2", ".hstb")
+
+    # ascii --> hex digit value, 255 for anything else
+    hexDigits = np.full(256, 255, dtype=np.uint8)
+    hexDigits[np.frombuffer(b"0123456789", dtype=np.uint8)] = np.arange(10)
+    hexDigits[np.frombuffer(b"abcdef", dtype=np.uint8)] = np.arange(10, 16)
+    hexDigits[np.frombuffer(b"ABCDEF", dtype=np.uint8)] = np.arange(10, 16)
+
+    # .hstb binary histograms, a header then fixed width little endian records
+    # header: magic, version, record size, record count, base PC,
+    # crc32 of the records, padding, ISA string (NUL padded)
+    binaryMagic = b"HSTB"
+    binaryVersion = 1
+    binaryHeader = struct.Struct("<4sHHQQI4x32s")
+    # the PCs are stored as offsets from the base PC, traces often hold
+    # sign extended 64bit PCs so the offsets are 64bit too
+    binaryRecord = np.dtype(
+        [("pcOffset", "<u8"), ("freq", "<u8"), ("word", "<u4"), ("reserved", "<u4")]
+    )
+
+    @staticmethod
+    def compression(filename):
+        """Returns the module (gzip, lzma or bz2) a file is compressed with,
+        going by its magic bytes, or None if it isn't compressed"""
+        with open(filename, "rb") as infile:
+            start = infile.read(max(len(magic) for magic in Histogram.compressions))
+        for magic, module in Histogram.compressions.items():
+            if start.startswith(magic):
+                return module
+        return None
+
+    @staticmethod
+    def openStream(filename):
+        """Opens a histogram for reading as a binary stream with a large
+        buffer, decompressing it on the fly if it is compressed"""
+        module = Histogram.compression(filename)
+        if module is None:
+            return open(filename, "rb", buffering=Histogram.readBufferSize)
+        return io.BufferedReader(module.open(filename, "rb"), Histogram.readBufferSize)
+
     @staticmethod
-    def parse(filename, isa="I32"):
-        """Parses a given file and converts into a program"""
-        program = Program(name=filename, isa=isa)
-        with open(filename) as infile:
-            start = False
+    def iterRecords(filename):
+        """Yields the (pc, word, freq) records of a .hst file as ints, one
+        line at a time and without decoding anything, so traces can be
+        filtered, aggregated or merged in constant memory. The records of
+        .hstb files are read batchSize at a time"""
+        if Histogram.isBinary(filename):
+            records = Histogram.load(filename)
+            for start in range(0, len(records["pc"]), Histogram.batchSize):
+                yield from zip(
+                    *(
+                        records[column][start : start + Histogram.batchSize].tolist()
+                        for column in ("pc", "word", "freq")
+                    )
+                )
+            return
 
+        with io.TextIOWrapper(Histogram.openStream(filename)) as infile:
             for line in infile:
-                if start:
-                    values = line.split(" ")
-                    pc = int(values[0], 16)
-                    hex = values[1]
-                    freq = int(values[2])
-                    program.addInstruction(pc, hex, freq)
+                if Histogram.headerEnd in line:
+                    break
+
+            for line in infile:
+                values = line.split()
+                if values:
+                    yield int(values[0], 16), int(values[1], 16), int(values[2])
+
+    @staticmethod
+    def parseArrays(filename):
+        """Reads the records of a .hst file into NumPy arrays. The file is
+        memory-mapped (or streamed, if compressed) and parsed in bulk, a chunk
+        of lines at a time, into arrays preallocated from the size in the header
+        Returns a dict of numpy arrays, one entry per record:
+            - pc: uint64
+            - word: uint32, ready for RV32.decodeMany
+            - freq: uint64"""
+        if not os.path.getsize(filename):
+            return Histogram.collectChunks(0, ())
+
+        if Histogram.compression(filename) is not None:
+            with Histogram.openStream(filename) as infile:
+                return Histogram.collectChunks(*Histogram.streamChunks(infile))
+
+        with open(filename, "rb") as infile, mmap.mmap(
+            infile.fileno(), 0, access=mmap.ACCESS_READ
+        ) as mm:
+            return Histogram.collectChunks(*Histogram.mappedChunks(mm))
+
+    @staticmethod
+    def mappedChunks(mm):
+        """Returns (the size in the header, a generator of the records of a
+        memory-mapped .hst file as uint8 arrays of whole lines)"""
+        header = mm.find(Histogram.headerEnd.encode())
+        if header == -1:
+            return 0, ()
+        start = mm.find(b"\n", header) + 1 or len(mm)
+        size = mm[header + len(Histogram.headerEnd) : start].strip()
+
+        def chunks(start):
+            while start < len(mm):
+                # chunks end on a line break
+                end = len(mm)
+                if start + Histogram.chunkSize < len(mm):
+                    end = mm.rfind(b"\n", start, start + Histogram.chunkSize) + 1
+                    end = end or len(mm)
 
-                if "PC Histogram size:" in line:
-                    start = True
+                # a copy of the chunk, a view would keep the map open
+                # if parsing raises
+                yield np.frombuffer(mm[start:end], dtype=np.uint8)
+                start = end
+
+        return int(size or 0), chunks(start)
+
+    @staticmethod
+    def streamChunks(infile):
+        """Returns (the size in the header, a generator of the records of a
+        .hst stream as uint8 arrays of whole lines)"""
+        for line in infile:
+            if Histogram.headerEnd.encode() in line:
+                break
+        else:
+            return 0, ()
+        size = line.split(Histogram.headerEnd.encode())[1].strip()
+
+        def chunks():
+            rest = b""
+            while True:
+                data = infile.read(Histogram.chunkSize)
+                if not data:
+                    break
+                # the part line at the end waits for the next read
+                end = data.rfind(b"\n") + 1
+                if end:
+                    yield np.frombuffer(rest + data[:end], dtype=np.uint8)
+                    rest = data[end:]
+                else:
+                    rest += data
+            if rest:
+                yield np.frombuffer(rest, dtype=np.uint8)
+
+        return int(size or 0), chunks()
+
+    @staticmethod
+    def collectChunks(size, chunks):
+        """Parses chunks of .hst records into the arrays parseArrays returns,
+        size is how many records to preallocate for"""
+        columns = np.zeros((3, size), dtype=np.uint64)
+        count = 0
+        for chunk in chunks:
+            records = Histogram.parseChunk(chunk)
+            if count + records.shape[1] > columns.shape[1]:
+                # the header undercounted
+                grow = max(count + records.shape[1], 2 * columns.shape[1])
+                columns = np.concatenate(
+                    (columns, np.zeros((3, grow - columns.shape[1]), np.uint64)),
+                    axis=1,
+                )
+            columns[:, count : count + records.shape[1]] = records
+            count += records.shape[1]
+
+        if (columns[1, :count] > 0xFFFFFFFF).any():
+            raise ValueError("instruction words in a .hst file are at most 32 bits")
+        return {
+            "pc": columns[0, :count].copy(),
+            "word": columns[1, :count].astype(np.uint32),
+            "freq": columns[2, :count].copy(),
+        }
+
+    @staticmethod
+    def parseChunk(text):
+        """Parses whole lines of .hst records held in a uint8 array
+        Returns a (3, records) uint64 array of the pcs, words and freqs"""
+        space = text <= ord(" ")
+        # tokens start and end where the text goes from space to not and back
+        edges = np.flatnonzero(np.diff(np.concatenate(([True], space, [True]))))
+        starts, ends = edges[0::2], edges[1::2]
+        if len(starts) % 3:
+            raise ValueError("each .hst record needs a pc, word and frequency")
+        # a record is the three tokens of one line, the tokens that start a
+        # line are the first ones after a line break (chunks start on a line)
+        lineStart = np.zeros(len(starts) + 1, dtype=bool)
+        lineStart[np.searchsorted(starts, np.flatnonzero(text == ord("\n")))] = True
+        lineStart[0] = True
+        lineStart = lineStart[:-1].reshape(-1, 3)
+        if not lineStart[:, 0].all() or lineStart[:, 1:].any():
+            raise ValueError("each .hst line needs exactly a pc, word and frequency")
+
+        lengths = ends - starts
+        return np.array(
+            [
+                Histogram.parseNumbers(text, ends[0::3], lengths[0::3], 16),
+                Histogram.parseNumbers(text, ends[1::3], lengths[1::3], 16),
+                Histogram.parseNumbers(text, ends[2::3], lengths[2::3], 10),
+            ],
+            dtype=np.uint64,
+        ).reshape(3, -1)
+
+    @staticmethod
+    def parseNumbers(text, ends, lengths, base):
+        """Returns a uint64 array of the numbers written in text, given where
+        each one ends and how many digits it has, one pass per digit place"""
+        values = np.zeros(len(ends), dtype=np.uint64)
+        if lengths.max(initial=0) > (16 if base == 16 else 19):
+            raise ValueError("{} is too long for a .hst value".format(lengths.max()))
+
+        placeValue = 1
+        for place in range(1, lengths.max(initial=0) + 1):
+            digits = np.where(
+                lengths >= place, Histogram.hexDigits[text[ends - place]], 0
+            )
+            if (digits >= base).any():
+                raise ValueError("bad digit in a base {} .hst value".format(base))
+            values += digits.astype(np.uint64) * np.uint64(placeValue)
+            placeValue *= base
+        return values
+
+    @staticmethod
+    def isBinary(filename):
+        """Returns True if a file is a .hstb binary histogram"""
+        with open(filename, "rb") as infile:
+            return infile.read(len(Histogram.binaryMagic)) == Histogram.binaryMagic
+
+    @staticmethod
+    def writeBinary(filename, records, isa=""):
+        """Writes records, a dict of pc, word and freq arrays (see parseArrays)
+        or an iterable of them written one after the other, out as a .hstb
+        binary histogram
+        Returns how many records were written"""
+        if isinstance(records, dict):
+            records = [records]
+
+        count, checksum, basePC = 0, 0, None
+        with open(filename, "wb") as outfile:
+            # the header is filled in once the records are written
+            outfile.write(bytes(Histogram.binaryHeader.size))
+            for batch in records:
+                pcs = np.asarray(batch["pc"], dtype=np.uint64)
+                if basePC is None and len(pcs):
+                    basePC = int(pcs.min())
+
+                data = np.zeros(len(pcs), dtype=Histogram.binaryRecord)
+                # PCs below the base PC wrap around, load wraps them back
+                data["pcOffset"] = pcs - np.uint64(basePC or 0)
+                data["word"] = batch["word"]
+                data["freq"] = batch["freq"]
+                body = data.tobytes()
+                checksum = zlib.crc32(body, checksum)
+                count += len(data)
+                outfile.write(body)
+
+            outfile.seek(0)
+            outfile.write(
+                Histogram.binaryHeader.pack(
+                    Histogram.binaryMagic,
+                    Histogram.binaryVersion,
+                    Histogram.binaryRecord.itemsize,
+                    count,
+                    basePC or 0,
+                    checksum,
+                    isa.encode(),
+                )
+            )
+        return count
+
+    @staticmethod
+    def write(filename, records, isa=""):
+        """Writes (pc, word, freq) records out as a histogram as they come,
+        so they can be a generator (see merge). A filename ending in .hstb
+        gets a binary histogram recording isa, anything else a .hst file
+        Returns how many records were written"""
+        if filename.endswith(".hstb"):
+            return Histogram.writeBinary(filename, Histogram.batchRecords(records), isa)
 
+        count = 0
+        with open(filename, "w") as outfile:
+            outfile.write("bbl loader\n")
+            # the size is filled in once the records are written
+            sizeAt = outfile.tell() + len(Histogram.headerEnd)
+            outfile.write(Histogram.headerEnd + " " * 20 + "\n")
+            for pc, word, freq in records:
+                outfile.write("{:x} {:x} {}\n".format(pc, word, freq))
+                count += 1
+            outfile.seek(sizeAt)
+            outfile.write(str(count))
+        return count
+
+    @staticmethod
+    def batchRecords(records):
+        """Yields (pc, word, freq) records batchSize at a time as dicts of
+        pc, word and freq arrays"""
+        records = iter(records)
+        while True:
+            batch = list(itertools.islice(records, Histogram.batchSize))
+            if not batch:
+                return
+            pcs, words, freqs = zip(*batch)
+            yield {
+                "pc": np.array(pcs, dtype=np.uint64),
+                "word": np.array(words, dtype=np.uint32),
+                "freq": np.array(freqs, dtype=np.uint64),
+            }
+
+    @staticmethod
+    def merge(filenames, conflicts=None):
+        """Merges the records of histograms sorted by PC, ex: one program run
+        on different inputs, holding one record per file in memory at once.
+        The frequencies of identical (pc, word) records are summed, a PC
+        recorded with different words is a conflict, its records are kept
+        apart and (pc, [words]) is appended to conflicts if it is given
+        Yields the merged (pc, word, freq) records in PC order"""
+        merged = heapq.merge(*(Histogram.iterRecords(name) for name in filenames))
+        previous = -1
+        for pc, records in itertools.groupby(merged, key=lambda record: record[0]):
+            if pc < previous:
+                raise ValueError("histogram records aren't sorted by PC")
+            previous = pc
+
+            words = {}
+            for _, word, freq in records:
+                words[word] = words.get(word, 0) + freq
+            if len(words) > 1 and conflicts is not None:
+                conflicts.append((pc, sorted(words)))
+            for word in sorted(words):
+                yield pc, word, words[word]
+
+    @staticmethod
+    def convert(filename, binaryFilename, isa=""):
+        """Converts a .hst text histogram into a .hstb binary one"""
+        Histogram.writeBinary(binaryFilename, Histogram.parseArrays(filename), isa)
+
+    @staticmethod
+    def readHeader(filename):
+        """Returns the header of a .hstb file as a dict of
+        isa, count, basePC and checksum"""
+        with open(filename, "rb") as infile:
+            header = infile.read(Histogram.binaryHeader.size)
+        if len(header) < Histogram.binaryHeader.size:
+            raise ValueError("{} is too short for a .hstb file".format(filename))
+
+        magic, version, recordSize, count, basePC, checksum, isa = (
+            Histogram.binaryHeader.unpack(header)
+        )
+        if magic != Histogram.binaryMagic:
+            raise ValueError("{} is not a .hstb file".format(filename))
+        if version != Histogram.binaryVersion:
+            raise ValueError("unsupported .hstb version {}".format(version))
+        if recordSize != Histogram.binaryRecord.itemsize:
+            raise ValueError("unexpected .hstb record size {}".format(recordSize))
+
+        return {
+            "isa": isa.rstrip(b"\0").decode(),
+            "count": count,
+            "basePC": basePC,
+            "checksum": checksum,
+        }
+
+    @staticmethod
+    def load(filename, verify=False):
+        """Opens a .hstb file without copying it, the records are a read only
+        numpy.memmap of the file, verify checks them against the checksum
+        Returns a dict of arrays like parseArrays, word and freq are views of
+        the memmap, pc is the base PC plus the stored offsets"""
+        header = Histogram.readHeader(filename)
+        size = (
+            Histogram.binaryHeader.size
+            + header["count"] * Histogram.binaryRecord.itemsize
+        )
+        if os.path.getsize(filename) != size:
+            raise ValueError(
+                "{} should hold {} records".format(filename, header["count"])
+            )
+
+        if header["count"]:
+            data = np.memmap(
+                filename,
+                dtype=Histogram.binaryRecord,
+                mode="r",
+                offset=Histogram.binaryHeader.size,
+                shape=(header["count"],),
+            )
+        else:
+            # an empty file can't be mapped
+            data = np.zeros(0, dtype=Histogram.binaryRecord)
+
+        if verify and zlib.crc32(data) != header["checksum"]:
+            raise ValueError("{} does not match its checksum".format(filename))
+
+        return {
+            "pc": data["pcOffset"] + np.uint64(header["basePC"]),
+            "word": data["word"],
+            "freq": data["freq"],
+        }
+
+    @staticmethod
+    def findFiles(dirname):
+        """Returns the histograms in a directory, compressed or not"""
+        return sorted(
+            os.path.join(dirname, name)
+            for name in os.listdir(dirname)
+            if name.endswith(Histogram.fileSuffixes)
+        )
+
+    @staticmethod
+    def readRecords(filename):
+        """Returns the records of a histogram of any kind (text, compressed
+        or .hstb) as a dict of pc, word and freq arrays, see parseArrays"""
+        if Histogram.isBinary(filename):
+            return Histogram.load(filename)
+        return Histogram.parseArrays(filename)
+
+    @staticmethod
+    def fileISA(filename, isa):
+        """Returns the ISA to decode a histogram with, a .hstb file's if
+        isa is None"""
+        if isa is None and Histogram.isBinary(filename):
+            return Histogram.readHeader(filename)["isa"]
+        return isa
+
+    @staticmethod
+    def buildProgram(filename, records, isa, lazy=True, decoded=None, built=None):
+        """Decodes the records of a histogram into a program, a .hstb file's
+        ISA is used if isa is None. decoded is (fields, index) from
+        decodeWords, the instructions are then built from their fields
+        rather than decoded again. built is a dictionary of fields -->
+        the instruction built from them, kept between calls so programs
+        share their instructions"""
+        program = Program(
+            name=filename, isa=Histogram.fileISA(filename, isa), lazy=lazy
+        )
+        if decoded is None:
+            for pc, word, freq in zip(
+                records["pc"].tolist(),
+                records["word"].tolist(),
+                records["freq"].tolist(),
+            ):
+                program.addInstructionWord(pc, word, freq)
+            return program
+
+        fields, index = decoded
+        if built is None:
+            built = {}
+        instructions = []
+        for f in fields:
+            if f is not None and f not in built:
+                built[f] = RVInstruction.intern(RVInstruction.fromFields(f))
+            instructions.append(built.get(f))
+
+        decodes = np.array([f is not None for f in fields], dtype=bool)[index]
+        for word in records["word"][~decodes].tolist():
+            print("ERROR decoding: {:x}".format(word))
+        program.addInstructionObjs(
+            records["pc"][decodes].tolist(),
+            [instructions[i] for i in index[decodes].tolist()],
+            records["freq"][decodes].tolist(),
+        )
         return program
+
+    @staticmethod
+    def decodeWords(words, rv):
+        """Decodes each distinct instruction word once
+        Returns (fields, index): the fields of the instruction of each
+        distinct word (see RVInstruction.fields), None where it doesn't
+        decode, and the position in fields of each word"""
+        unique, index = np.unique(words, return_inverse=True)
+        fields = []
+        for word in unique.tolist():
+            inst = rv.decodeInt(word)
+            fields.append(inst.fields() if inst is not None else None)
+        return fields, index
+
+    @staticmethod
+    def filterRecords(records, minFreq=None, pcRanges=None, coverage=None, rv=None):
+        """Keeps the hot part of a histogram's records, before anything is
+        decoded
+            minFreq - keep PCs executed at least this many times
+            pcRanges - keep PCs in one of these [start, end) ranges
+            coverage - keep the most executed PCs that between them make up
+                this fraction of the executed instructions, ex: 0.99
+        The instructions of a basic block execute the same number of times,
+        so every run of contiguous PCs with the same frequency as a kept PC is
+        kept too, leaving findBasicBlocks whole blocks (and their control
+        transfers) rather than fragments of them. Given the RV32 to decode
+        with, cold PC relative branches and jumps into kept code are kept
+        too, so the leaders they make are still found
+        Returns a dict of arrays like parseArrays"""
+        pcs, words, freqs = records["pc"], records["word"], records["freq"]
+        keep = np.ones(len(pcs), dtype=bool)
+        if minFreq is not None:
+            keep &= freqs >= minFreq
+        if pcRanges is not None:
+            inRanges = np.zeros(len(pcs), dtype=bool)
+            for start, end in pcRanges:
+                inRanges |= (pcs >= np.uint64(start)) & (pcs < np.uint64(end))
+            keep &= inRanges
+        if coverage is not None and len(pcs):
+            hottest = np.argsort(freqs, kind="stable")[::-1]
+            covered = np.cumsum(freqs[hottest], dtype=np.float64)
+            count = np.searchsorted(covered, coverage * covered[-1]) + 1
+            hot = np.zeros(len(pcs), dtype=bool)
+            hot[hottest[:count]] = True
+            keep &= hot
+
+        # runs of contiguous PCs executed as often as each other, a 32bit
+        # instruction's word ends in 0b11
+        order = np.argsort(pcs, kind="stable")
+        pcs, freqs, keep = pcs[order], freqs[order], keep[order]
+        sizes = np.where(words[order] & 0b11 == 0b11, 4, 2).astype(np.uint64)
+        starts = np.ones(len(pcs), dtype=bool)
+        starts[1:] = (pcs[1:] != pcs[:-1] + sizes[:-1]) | (freqs[1:] != freqs[:-1])
+        runs = np.cumsum(starts) - 1
+        keptRuns = np.zeros(len(pcs), dtype=bool)
+        keptRuns[runs[keep]] = True
+
+        keep = keptRuns[runs]
+
+        if rv is not None:
+            # only branch and jump opcodes are decoded: B and JAL, and
+            # C.JAL, C.J, C.BEQZ and C.BNEZ
+            words = words[order]
+            jumps = np.where(
+                words & 0b11 == 0b11,
+                np.isin(words & 0x7F, (0b1100011, 0b1101111)),
+                (words & 0b11 == 0b01) & np.isin(words >> 13 & 0b111, (1, 5, 6, 7)),
+            )
+            keptPCs = set(pcs[keep].tolist())
+            for i in np.flatnonzero(jumps & ~keep).tolist():
+                inst = rv.decodeInt(int(words[i]))
+                if inst is not None and inst.isControlTransferPCRelative():
+                    keep[i] = int(pcs[i]) + inst.immediates[0] in keptPCs
+
+        kept = order[keep]
+        return {column: records[column][kept] for column in ("pc", "word", "freq")}
+
+    @staticmethod
+    def cachedRecords(filename, isa, cache):
+        """Returns (the key of the file in cache, the cached arrays of the
+        file), reading the records and adding them to cache if they aren't in
+        it, see readRecords. Without a cache returns (None, the records)"""
+        if not cache:
+            return None, Histogram.readRecords(filename)
+
+        key = cache.key(filename, isa)
+        entry = cache.load(key)
+        if entry is None or "pc" not in entry:
+            entry = Histogram.readRecords(filename)
+            cache.store(key, pc=entry["pc"], word=entry["word"], freq=entry["freq"])
+            entry = cache.load(key) or entry
+        return key, entry
+
+    @staticmethod
+    def parse(
+        filename,
+        isa="I32",
+        lazy=True,
+        cache=None,
+        minFreq=None,
+        pcRanges=None,
+        coverage=None,
+    ):
+        """Parses a given file and converts into a program,
+        by default operands are only decoded for the instructions that need them (see LazyRVInstruction)
+        .hstb binary histograms are loaded as they are, their ISA is used if isa is None
+        cache is a ProgramCache the program is kept in, by default the one in
+        $RVNEWOP_CACHE if it is set (see ProgramCache.default), False for none
+        minFreq, pcRanges and coverage leave out the cold instructions before
+        they are decoded, see filterRecords
+        """
+        return Histogram.parseMany(
+            [filename], isa, 1, lazy, cache, minFreq, pcRanges, coverage
+        )[0]
+
+    @staticmethod
+    def parseMany(
+        filenames,
+        isa="I32",
+        jobs=None,
+        lazy=True,
+        cache=None,
+        minFreq=None,
+        pcRanges=None,
+        coverage=None,
+    ):
+        """Parses several files into programs, see parse. The files are read,
+        filtered and decoded by a pool of jobs processes (all the cores if
+        None) which send back their records and the fields of each distinct
+        instruction, programs don't pickle. The programs are built here from
+        those, without decoding, with fully decoded instructions shared
+        between them
+        Returns a list of programs in the order of filenames"""
+        if cache is None:
+            cache = ProgramCache.default()
+
+        serial = jobs == 1 or len(filenames) < 2
+        read = functools.partial(
+            Histogram.readFile,
+            isa=isa,
+            lazy=lazy,
+            cache=cache,
+            filters=(minFreq, pcRanges, coverage),
+            decode=not serial,
+        )
+        if serial:
+            results = [read(filename) for filename in filenames]
+        else:
+            with ProcessPoolExecutor(jobs) as pool:
+                results = list(pool.map(read, filenames))
+
+        programs = []
+        built = {}
+        for filename, (key, entry, records, decoded) in zip(filenames, results):
+            program = Histogram.buildProgram(
+                filename, records, isa, lazy, decoded, built
+            )
+            if key is not None:
+                program.useCache(cache, key, entry)
+            programs.append(program)
+        return programs
+
+    @staticmethod
+    def readFile(filename, isa, lazy, cache, filters, decode):
+        """The part of parseMany done by its processes: reads the records of
+        a file (see cachedRecords), filters them (see filterRecords, filters
+        is (minFreq, pcRanges, coverage)) and if decode, decodes their words
+        (see decodeWords)
+        Returns (key, entry, records, decoded), key is None if the records
+        were filtered, as the cached analysis is of the whole program, and
+        decoded is None unless decode"""
+        key, entry = Histogram.cachedRecords(filename, isa, cache)
+        records = entry
+        rv = None
+        if filters != (None, None, None):
+            rv = RV32(Histogram.fileISA(filename, isa), lazy=lazy)
+            records = Histogram.filterRecords(entry, *filters, rv)
+            key = None
+
+        decoded = None
+        if decode:
+            rv = rv or RV32(Histogram.fileISA(filename, isa), lazy=lazy)
+            decoded = Histogram.decodeWords(records["word"], rv)
+        return key, entry, records, decoded
@@ -50,6 +50,8 @@ class I32:
     def JALR(ba):
         """Creates 'Jump And Link Register' Instruction"""
         data = fp.parseI(ba)
+        if data["funct3"] != bitarray("000"):
+            return None
         return RVInstruction(
             rv_format="I",
             rv_src_registers=[data["rs1"]],
@@ -228,6 +230,10 @@ class I32:
         f7 = data["funct7"]
         name = ""
 
+        # any other funct7 belongs to an extension, ex: 0000001 is M32
+        if f7 != bitarray("0000000") and f7 != bitarray("0100000"):
+            return None
+
         if f3 == bitarray("000"):
             if f7[1] == 0:
                 # ADD
@@ -299,6 +305,66 @@ class I32:
         frozenbitarray("0001111"): FENCE.__func__,
     }
 
+    # (name, match, mask, operand format), see RVEncoding
+    encodings = (
+        ("lui", 0x00000037, 0x0000007F, "U"),
+        ("auipc", 0x00000017, 0x0000007F, "U"),
+        ("jal", 0x0000006F, 0x0000007F, "J"),
+        ("jalr", 0x00000067, 0x0000707F, "I"),
+        ("beq", 0x00000063, 0x0000707F, "B"),
+        ("bne", 0x00001063, 0x0000707F, "B"),
+        ("blt", 0x00004063, 0x0000707F, "B"),
+        ("bge", 0x00005063, 0x0000707F, "B"),
+        ("bltu", 0x00006063, 0x0000707F, "B"),
+        ("bgeu", 0x00007063, 0x0000707F, "B"),
+        ("lb", 0x00000003, 0x0000707F, "I"),
+        ("lh", 0x00001003, 0x0000707F, "I"),
+        ("lw", 0x00002003, 0x0000707F, "I"),
+        ("lbu", 0x00004003, 0x0000707F, "I"),
+        ("lhu", 0x00005003, 0x0000707F, "I"),
+        ("sb", 0x00000023, 0x0000707F, "S"),
+        ("sh", 0x00001023, 0x0000707F, "S"),
+        ("sw", 0x00002023, 0x0000707F, "S"),
+        ("addi", 0x00000013, 0x0000707F, "I"),
+        ("slti", 0x00002013, 0x0000707F, "I"),
+        ("sltiu", 0x00003013, 0x0000707F, "I"),
+        ("xori", 0x00004013, 0x0000707F, "I"),
+        ("ori", 0x00006013, 0x0000707F, "I"),
+        ("andi", 0x00007013, 0x0000707F, "I"),
+        ("slli", 0x00001013, 0xFE00707F, "I_SHAMT"),
+        ("srli", 0x00005013, 0xFE00707F, "I_SHAMT"),
+        ("srai", 0x40005013, 0xFE00707F, "I_SHAMT"),
+        ("add", 0x00000033, 0xFE00707F, "R"),
+        ("sub", 0x40000033, 0xFE00707F, "R"),
+        ("sll", 0x00001033, 0xFE00707F, "R"),
+        ("slt", 0x00002033, 0xFE00707F, "R"),
+        ("sltu", 0x00003033, 0xFE00707F, "R"),
+        ("xor", 0x00004033, 0xFE00707F, "R"),
+        ("srl", 0x00005033, 0xFE00707F, "R"),
+        ("sra", 0x40005033, 0xFE00707F, "R"),
+        ("or", 0x00006033, 0xFE00707F, "R"),
+        ("and", 0x00007033, 0xFE00707F, "R"),
+        # FENCE, ECALL and EBREAK are unsupported
+        ("fence", 0x0000000F, 0x0000707F, None),
+        ("fence.i", 0x0000100F, 0x0000707F, None),
+        ("ecall", 0x00000073, 0xFFFFFFFF, None),
+        ("ebreak", 0x00100073, 0xFFFFFFFF, None),
+        # so are the privileged and CSR instructions sharing their opcode
+        ("sret", 0x10200073, 0xFFFFFFFF, None),
+        ("mret", 0x30200073, 0xFFFFFFFF, None),
+        ("wfi", 0x10500073, 0xFFFFFFFF, None),
+        ("sfence.vma", 0x12000073, 0xFE007FFF, None),
+        ("csrrw", 0x00001073, 0x0000707F, None),
+        ("csrrs", 0x00002073, 0x0000707F, None),
+        ("csrrc", 0x00003073, 0x0000707F, None),
+        ("csrrwi", 0x00005073, 0x0000707F, None),
+        ("csrrsi", 0x00006073, 0x0000707F, None),
+        ("csrrci", 0x00007073, 0x0000707F, None),
+        # as is everything else under those two opcodes
+        ("unsupported", 0x0000000F, 0x0000007F, None),
+        ("unsupported", 0x00000073, 0x0000007F, None),
+    )
+
     instructionNameSet = {
         "lui",
         "auipc",
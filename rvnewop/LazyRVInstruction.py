@@ -0,0 +1,42 @@
+from . import RVInstruction
+
+
+class LazyRVInstruction(RVInstruction):
+    """An RVInstruction that only knows its name, format and size up front,
+    the registers, immediates and mask are decoded from the instruction word
+    the first time any of them is read"""
+
+    __slots__ = ("build",)
+
+    # formats that always have a destination register
+    destFormats = {"R", "I", "U", "J"}
+
+    # the slots filled in on first read
+    operandSlots = {"_src_ids", "_dest_ids", "_immediates", "_mask"}
+
+    def __init__(self, rv_format, rv_name, rv_size, rv_binary, build):
+        """Constructs a LazyRVInstruction
+
+        - build: a function(name, word) that returns the fully decoded RVInstruction"""
+        self.format = rv_format
+        self.name = rv_name
+        self.size = rv_size
+        self.binary = rv_binary
+        self.flags = RVInstruction.nameFlags(rv_name)
+        if rv_format in LazyRVInstruction.destFormats:
+            self.flags |= RVInstruction.WRITES_RD
+        self.build = build
+
+    def __getattr__(self, attr):
+        # only called for slots that are still unset
+        if attr not in LazyRVInstruction.operandSlots:
+            raise AttributeError(attr)
+
+        inst = self.build(self.name, self.binary)
+        for slot in LazyRVInstruction.operandSlots:
+            # keep anything set through a property in the meantime
+            try:
+                object.__getattribute__(self, slot)
+            except AttributeError:
+                object.__setattr__(self, slot, getattr(inst, slot))
+        return object.__getattribute__(self, attr)
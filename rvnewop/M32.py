@@ -24,7 +24,7 @@ class M32:
             name = "mulh"
         elif f3 == bitarray("010"):
             # MULHSU
-            name = "MULHSU"
+            name = "mulhsu"
         elif f3 == bitarray("011"):
             # MULHU
             name = "mulhu"
@@ -56,10 +56,22 @@ class M32:
         frozenbitarray("0110011"): MULTIPLY.__func__,
     }
 
+    # (name, match, mask, operand format), see RVEncoding
+    encodings = (
+        ("mul", 0x02000033, 0xFE00707F, "R"),
+        ("mulh", 0x02001033, 0xFE00707F, "R"),
+        ("mulhsu", 0x02002033, 0xFE00707F, "R"),
+        ("mulhu", 0x02003033, 0xFE00707F, "R"),
+        ("div", 0x02004033, 0xFE00707F, "R"),
+        ("divu", 0x02005033, 0xFE00707F, "R"),
+        ("rem", 0x02006033, 0xFE00707F, "R"),
+        ("remu", 0x02007033, 0xFE00707F, "R"),
+    )
+
     instructionNameSet = {
         "mul",
         "mulh",
-        "MULHSU",
+        "mulhsu",
         "mulhu",
         "div",
         "divu",
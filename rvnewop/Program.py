@@ -1,39 +1,72 @@
 from . import RV32
 from . import BasicBlock
+from . import RVInstruction
+from .ProgramCache import ProgramCache
 
+import bisect
+import struct
 import sys
+from collections import deque
 import networkx as nx
+import numpy as np
 
 
 class Program:
     """A Program is a collection of instructions which are mapped to pc values"""
 
-    def __init__(self, name, isa="32I"):
+    # programs with at least this many instructions have their basic blocks
+    # found with array operations, see findBasicBlocksArrays
+    arrayBlocksThreshold = 1 << 12
+
+    # ELF class (32 or 64bit) --> the fields of the ELF header after e_ident
+    elfHeaders = {
+        1: struct.Struct("<HHIIIIIHHHHHH"),
+        2: struct.Struct("<HHIQQQIHHHHHH"),
+    }
+    # ELF class --> the first fields of a section header: name, type, flags,
+    # address, offset and size
+    elfSections = {1: struct.Struct("<IIIIII"), 2: struct.Struct("<IIQQQQ")}
+    # e_machine of RISC-V
+    elfMachine = 243
+
+    def __init__(self, name, isa="32I", lazy=False):
+        """lazy leaves the operands of instructions undecoded until they are
+        first needed, see LazyRVInstruction"""
         self.name = name
-        self.rv = RV32(isa=isa)
+        self.rv = RV32(isa=isa, lazy=lazy)
         self.instructions = {}  # maps pc value -> RVInstruction
         self.frequencies = {}  # maps pc value -> frequency of instruction
 
-        # sets of names, registers, and formats for analysis
+        # sets of names and formats for analysis, see also registerSet
         self.instructionNameSet = set()
-        self.registerSet = set()
         self.formatSet = set()
         self.basicBlocks = list()
+        # names of the sub-blocks whose frequencies changed, see updateFrequencies
+        self.dirtyBlocks = set()
+
+        # the ProgramCache entry holding the basic blocks and liveness of the
+        # program, see useCache
+        self.cache = None
+        self.cacheKey = None
+        self.cached = {}
 
         # list for liveness graph
         self.loop_backs = []
 
     def _addInstruction(self, pc, inst, freq):
-        inst.freq = freq
+        if self.cache is not None:
+            # the cached analysis is of the program as it was
+            self.useCache(None, None, {})
+
+        # decoded instructions can be shared between PCs (and programs),
+        # so per PC state such as the frequency is kept in the Program
         self.instructions[pc] = inst
 
         # add to set as you go
         self.instructionNameSet.add(inst.name)
-        self.registerSet.update(set(inst.src_registers) | set(inst.dest_registers))
         self.formatSet.add(inst.format)
 
-        # TODO decouple storing frequencies from program?
-        self.frequencies[pc] = inst.freq
+        self.frequencies[pc] = freq
 
     """ This function is mostly meant for easily creating
         synthetic programs that can be used for testing
@@ -44,6 +77,17 @@ class Program:
             return
         self._addInstruction(pc, inst, freq)
 
+    def addInstructionObjs(self, pcs, insts, freqs):
+        """addInstructionObj for lists of PCs, instructions and frequencies,
+        added all at once rather than one at a time"""
+        if self.cache is not None:
+            self.useCache(None, None, {})
+        self.instructions.update(zip(pcs, insts))
+        self.frequencies.update(zip(pcs, freqs))
+        for inst in set(insts):
+            self.instructionNameSet.add(inst.name)
+            self.formatSet.add(inst.format)
+
     def addInstruction(self, pc, hexd, freq):
         """Adds an instruction to a Program given a PC value
         and the instruction hex value
@@ -57,6 +101,171 @@ class Program:
             return
         self._addInstruction(pc, inst, freq)
 
+    def addInstructionWord(self, pc, word, freq):
+        """Adds an instruction to a Program given a PC value
+        and the instruction word as an int, see addInstruction"""
+        inst = self.rv.decodeInt(word)
+        if not inst:
+            print("ERROR decoding: {:x}".format(word))
+            return
+        self._addInstruction(pc, inst, freq)
+
+    def useCache(self, cache, key, entry):
+        """Keeps the analysis of the program in a ProgramCache entry,
+        entry holds the arrays already in it"""
+        self.cache = cache
+        self.cacheKey = key
+        self.cached = entry
+
+    def storeCache(self, **arrays):
+        """Adds arrays to the cache entry of the program, if it has one"""
+        if self.cache is not None:
+            self.cache.store(self.cacheKey, **arrays)
+            self.cached.update(arrays)
+
+    def updateFrequencies(self, records):
+        """Updates the frequencies of instructions already in the program,
+        ex: from a histogram of the same binary run on another input, keeping
+        its basic blocks, sub-block graph, liveness and DAGs. Only the basic
+        blocks holding a changed PC are touched, their frequencies and the
+        frequencies in their DAGs (see BasicBlock.getDAG) are updated and the
+        names of their sub-blocks are added to dirtyBlocks, only the subgraphs
+        of those need Subgraph.updateScore
+
+        records - (pc, word, freq) records, see Histogram.iterRecords
+        Returns the set of names of the sub-blocks whose frequencies changed"""
+        changed = []
+        for pc, word, freq in records:
+            inst = self.instructions.get(pc)
+            decoded = self.rv.decodeInt(word)
+            if (
+                inst is None
+                or decoded is None
+                or (decoded.name, decoded.binary) != (inst.name, inst.binary)
+            ):
+                raise ValueError(
+                    "{:x} isn't the instruction at {:x}, "
+                    "the program needs to be parsed again".format(word, pc)
+                )
+            if self.frequencies[pc] != freq:
+                self.frequencies[pc] = freq
+                changed.append(pc)
+
+        blocks = sorted(self.basicBlocks, key=lambda block: block.start)
+        starts = [block.start for block in blocks]
+        dirty = set()
+        for pc in changed:
+            i = bisect.bisect_right(starts, pc) - 1
+            if i < 0 or pc > blocks[i].end:
+                continue
+            block = blocks[i]
+            block.frequency = self.frequencies[block.end]
+            for sub_block in block.sub_blocks:
+                sub_block.frequency = block.frequency
+                sub_block.updateDAGFrequencies()
+                dirty.add(sub_block.name)
+
+        self.dirtyBlocks.update(dirty)
+        return dirty
+
+    @property
+    def registerSet(self):
+        """The set of registers the instructions use, worked out when asked
+        for so lazily decoded instructions keep their operands undecoded"""
+        registers = set()
+        for inst in self.instructions.values():
+            registers.update(inst.src_registers)
+            registers.update(inst.dest_registers)
+        return registers
+
+    def addStaticInstruction(self, pc, word):
+        """Adds an instruction of a static listing with a frequency of 0,
+        words that don't decode (ex: data in the section) are left out"""
+        try:
+            inst = self.rv.decodeInt(word)
+        except ValueError:
+            # reserved encodings
+            return
+        # unknown opcodes decode to an "error" placeholder, others to None
+        if inst and inst.name != "error":
+            self._addInstruction(pc, inst, 0)
+
+    @staticmethod
+    def fromObjdump(filename, isa="32I", lazy=False):
+        """Returns the static program listed in an objdump disassembly, one
+        line at a time, every instruction in it with a frequency of 0.
+        The counts of a histogram can be joined onto it with
+        addInstructionWord, which adds the PCs it doesn't list, before its
+        basic blocks are found (and with updateFrequencies after)"""
+        program = Program(name=filename, isa=isa, lazy=lazy)
+        with open(filename) as infile:
+            for line in infile:
+                # <pc>: <word> <disassembly>
+                fields = line.split(None, 2)
+                if len(fields) < 2 or not fields[0].endswith(":"):
+                    continue
+                try:
+                    pc, word = int(fields[0][:-1], 16), int(fields[1], 16)
+                except ValueError:
+                    # ex: Disassembly of section .text:
+                    continue
+                program.addStaticInstruction(pc, word)
+        return program
+
+    @staticmethod
+    def fromElf(filename, isa=None, lazy=False, sections=(".text",)):
+        """Returns the static program in the sections of a little endian
+        RISC-V ELF file, every instruction with a frequency of 0, see
+        fromObjdump. Without an isa it is 32IM, plus C if the ELF is flagged
+        as using compressed instructions"""
+        with open(filename, "rb") as infile:
+            # only the headers and the sections asked for are read
+            ident = infile.read(16)
+            if (
+                ident[:4] != b"\x7fELF"
+                or ident[4] not in Program.elfHeaders
+                or ident[5] != 1
+            ):
+                raise ValueError("{} is not a little endian ELF file".format(filename))
+            header = Program.elfHeaders[ident[4]]
+            _, machine, _, _, _, shoff, flags, _, _, _, shentsize, shnum, shstrndx = (
+                header.unpack(infile.read(header.size))
+            )
+            if machine != Program.elfMachine:
+                raise ValueError("{} is not a RISC-V ELF file".format(filename))
+            section = Program.elfSections[ident[4]]
+
+            # (name offset, type, flags, address, offset, size) of every section
+            infile.seek(shoff)
+            table = infile.read(shnum * shentsize)
+            headers = [section.unpack_from(table, i * shentsize) for i in range(shnum)]
+            infile.seek(headers[shstrndx][4])
+            names = infile.read(headers[shstrndx][5])
+
+            if isa is None:
+                # EF_RISCV_RVC
+                isa = "32IMC" if flags & 0x1 else "32IM"
+            program = Program(name=filename, isa=isa, lazy=lazy)
+
+            for name, _, _, address, offset, size in headers:
+                name = names[name : names.index(b"\0", name)].decode()
+                if name not in sections:
+                    continue
+
+                infile.seek(offset)
+                code = infile.read(size)
+                offset = 0
+                while offset + 2 <= len(code):
+                    word = int.from_bytes(code[offset : offset + 2], "little")
+                    if word & 0b11 == 0b11 and offset + 4 <= len(code):
+                        # a 32bit instruction
+                        word = int.from_bytes(code[offset : offset + 4], "little")
+                    program.addStaticInstruction(address, word)
+                    step = 4 if word & 0b11 == 0b11 else 2
+                    address += step
+                    offset += step
+        return program
+
     def getTotalInstructionCount(self):
         total_ins = 0
         for pc in self.frequencies:
@@ -109,7 +318,7 @@ class Program:
         return
 
     def createBasicBlocks(self):
-        idx = 0
+        bounds = []
         for entry in self.leader:
             if entry in self.instructions:
                 start_pc = entry
@@ -118,75 +327,247 @@ class Program:
                 while next_pc in self.instructions and next_pc not in self.leader:
                     prev_pc = next_pc
                     next_pc = prev_pc + self.instructions[next_pc].sizeInBytes()
-                bb = BasicBlock(
-                    "B" + str(idx),
-                    start_pc,
-                    prev_pc,
-                    self.frequencies[prev_pc],
-                    self.instructions,
-                )
-                self.basicBlocks.append(bb)
-                idx += 1
+                bounds.append((start_pc, prev_pc))
+        self.createBasicBlocksFrom(bounds)
+
+    def createBasicBlocksFrom(self, bounds):
+        """Creates the basic blocks given the (start, end) PCs of each,
+        named in that order"""
+        for idx, (start_pc, end_pc) in enumerate(bounds):
+            bb = BasicBlock(
+                "B" + str(idx),
+                start_pc,
+                end_pc,
+                self.frequencies[end_pc],
+                self.instructions,
+                self.frequencies,
+            )
+            self.basicBlocks.append(bb)
         for block in self.basicBlocks:
             block.genSubBlocks()
 
         self.createSubBlockGraph()
 
     def findBasicBlocks(self):
+        # found again from scratch, ex: for a program that is still growing
+        self.basicBlocks = list()
         self.visited = {}
         self.leader = {}
-        for pc in self.instructions:
-            self.visited[pc] = False
+        if "leaders" in self.cached:
+            self.leader = dict.fromkeys(self.cached["leaders"].tolist(), True)
+            self.createBasicBlocks()
+            return
 
-        explore_leader = []
-        while self.getNextUnvisited() is not None:
-            min_pc = self.getNextUnvisited()
+        if (
+            len(self.instructions) < Program.arrayBlocksThreshold
+            or not self.findBasicBlocksArrays()
+        ):
+            self.findLeaders()
+            self.createBasicBlocks()
+
+        # only leaders that are instructions matter to createBasicBlocks
+        self.storeCache(
+            leaders=np.array(
+                [pc for pc in self.leader if pc in self.instructions], dtype=np.uint64
+            )
+        )
+
+    def findLeaders(self):
+        # the PCs in order, the ones before the cursor are all visited so the
+        # next unvisited PC is found without going back over them
+        pcs = sorted(self.instructions)
+        self.visited = dict.fromkeys(pcs, False)
+        cursor = 0
+
+        explore_leader = deque()
+        while True:
+            while cursor < len(pcs) and self.visited[pcs[cursor]]:
+                cursor += 1
+            if cursor == len(pcs):
+                break
+            min_pc = pcs[cursor]
             # first leader is the min_pc
             self.leader[min_pc] = True
-            self.visited[min_pc] = True
 
             explore_leader.append(min_pc)
-            while len(explore_leader):
-                pc = explore_leader[0]
-                explore_leader.remove(pc)
-                if pc not in self.instructions:
+            while explore_leader:
+                pc = explore_leader.popleft()
+                if not self.visited.get(pc, True):
+                    self.scanFromLeader(pc, explore_leader)
+
+    def scanFromLeader(self, pc, explore_leader):
+        """ scan sequentially starting at this PC
+            until one of:
+            - no next PC
+            - a visited PC
+            - branch/jump
+            If no next PC, then we are done with this PC
+            A visited PC was scanned from before on to the same branch/jump,
+            whose leaders are already known, so we are done too
+            If branch/jump, then add branch/jump destination as a leader
+            (if we know the address)
+            Also add the instruction following branch/jump PC as another
+            leader """
+        insn = self.instructions[pc]
+        while not insn.isControlTransfer():
+            self.visited[pc] = True
+            pc = pc + insn.sizeInBytes()
+            if self.visited.get(pc, True):
+                return
+            insn = self.instructions[pc]
+
+        """we encountered a control transfer instruction
+        mark the next PC following the control transfer
+        as a leader"""
+        self.visited[pc] = True
+        leader_pc = pc + insn.sizeInBytes()
+        if leader_pc not in self.leader:
+            self.leader[leader_pc] = True
+            explore_leader.append(leader_pc)
+        """ we check if control transfer instruction is PC relative.
+            If yes, then we can determine the branch target address.
+            That address will be another leader. """
+        if insn.isControlTransferPCRelative():
+            target_pc = pc + insn.immediates[0]
+            if target_pc not in self.leader:
+                self.leader[target_pc] = True
+                explore_leader.append(target_pc)
+
+    def instructionColumns(self):
+        """Returns a dictionary of arrays over the instructions in PC order:
+        pc, size (in bytes), control (control transfers), relative
+        (PC relative control transfers) and immediate (the offset of the
+        PC relative control transfers, 0 for the rest)"""
+        pcs = sorted(self.instructions)
+        insns = [self.instructions[pc] for pc in pcs]
+        flags = np.array([insn.flags for insn in insns], dtype=np.int64)
+        relative = flags & RVInstruction.CONTROL_TRANSFER_PC_RELATIVE != 0
+        immediate = np.zeros(len(pcs), dtype=np.int64)
+        for i in np.flatnonzero(relative):
+            immediate[i] = insns[i].immediates[0]
+        return {
+            "pc": np.array(pcs, dtype=np.uint64),
+            "size": np.array([insn.size // 8 for insn in insns], dtype=np.uint64),
+            "control": flags & RVInstruction.CONTROL_TRANSFER != 0,
+            "relative": relative,
+            "immediate": immediate,
+        }
+
+    @staticmethod
+    def branchTargets(columns):
+        """Returns an array of the index into columns (see instructionColumns)
+        of the target of each PC relative control transfer, -1 if the target
+        isn't an instruction, and for the rest of the instructions"""
+        pc = columns["pc"]
+        branches = np.flatnonzero(columns["relative"])
+        offsets = columns["immediate"][branches]
+        targets = pc[branches] + offsets.astype(np.uint64)
+        # targets past either end of the address space wrap around
+        inside = np.where(offsets < 0, targets < pc[branches], targets >= pc[branches])
+        found = np.minimum(np.searchsorted(pc, targets), len(pc) - 1)
+        hit = inside & (pc[found] == targets)
+
+        index = np.full(len(pc), -1, dtype=np.int64)
+        index[branches[hit]] = found[hit]
+        return index
+
+    @staticmethod
+    def blockBoundaries(columns):
+        """Returns (starts, ends), arrays of the indices into columns (see
+        instructionColumns) of the first and last instruction of each basic
+        block, in PC order
+        A block starts after a gap in the PCs, after a control transfer and
+        at the target of a PC relative control transfer. Returns None if
+        some instructions overlap, their blocks don't follow the PC order"""
+        pc = columns["pc"]
+        following = pc + columns["size"]
+        if np.any(following[:-1] > pc[1:]):
+            return None
+
+        leader = np.ones(len(pc), dtype=bool)
+        leader[1:] = (following[:-1] != pc[1:]) | columns["control"][:-1]
+        targets = Program.branchTargets(columns)
+        leader[targets[targets >= 0]] = True
+
+        starts = np.flatnonzero(leader)
+        ends = np.append(starts[1:] - 1, len(pc) - 1)
+        return starts, ends
+
+    def findBasicBlocksArrays(self):
+        """findBasicBlocks for large programs: finds the block boundaries with
+        array operations (see blockBoundaries) then names the blocks in the
+        order findLeaders finds them, going over the leaders rather than
+        every instruction. Only the leaders that are instructions are kept
+        Returns False, having done nothing, if some instructions overlap"""
+        columns = self.instructionColumns()
+        boundaries = Program.blockBoundaries(columns)
+        if boundaries is None:
+            return False
+        starts, ends = boundaries
+        count = len(columns["pc"])
+
+        # findLeaders scans from a leader on to the next control transfer or
+        # gap, the end of a segment, stopping early at a PC an earlier scan
+        # went over. Within a segment the PCs scanned are the ones from the
+        # lowest leader scanned from on, and only the first scan of a segment
+        # reaches its end and adds the leaders after it
+        gap = np.ones(count, dtype=bool)
+        gap[:-1] = (columns["pc"] + columns["size"])[:-1] != columns["pc"][1:]
+        segmentEnds = np.flatnonzero(columns["control"] | gap)
+        segmentStarts = np.append(0, segmentEnds + 1)[: len(segmentEnds)]
+        # the leaders after each segment as indices, -1 if there is none
+        # or it isn't an instruction, and the segments they are in
+        following = np.where(
+            columns["control"][segmentEnds] & ~gap[segmentEnds], segmentEnds + 1, -1
+        )
+        targets = Program.branchTargets(columns)[segmentEnds]
+        followingSegments = np.searchsorted(segmentEnds, following)
+        targetSegments = np.searchsorted(segmentEnds, targets)
+
+        following = following.tolist()
+        targets = targets.tolist()
+        followingSegments = followingSegments.tolist()
+        targetSegments = targetSegments.tolist()
+        transfers = columns["control"][segmentEnds].tolist()
+        # the lowest index scanned from in each segment, count if none
+        scanned = [count] * len(segmentEnds)
+        leader = bytearray(count)
+        order = []
+
+        explore_leader = deque()
+        for segment, start in enumerate(segmentStarts.tolist()):
+            if scanned[segment] == start:
+                continue
+            if not leader[start]:
+                leader[start] = True
+                order.append(start)
+            explore_leader.append((start, segment))
+            while explore_leader:
+                i, t = explore_leader.popleft()
+                if scanned[t] <= i:
                     continue
-                """ scan sequentially starting at this PC
-                    until one of:
-                    - no next PC
-                    - branch/jump
-                    If no next PC, then we are done with this PC
-                    If branch/jump, then add branch/jump destination as a leader
-                    (if we know the address)
-                    Also add the instruction following branch/jump PC as another
-                    leader """
-                insn = self.instructions[pc]
-                end_of_sequence = False
-                while not insn.isControlTransfer():
-                    self.visited[pc] = True
-                    pc = pc + insn.sizeInBytes()
-                    if pc not in self.instructions:
-                        end_of_sequence = True
-                        break
-                    insn = self.instructions[pc]
-                if not end_of_sequence:
-                    """we encountered a control transfer instruction
-                    mark the next PC following the control transfer
-                    as a leader"""
-                    self.visited[pc] = True
-                    leader_pc = pc + insn.sizeInBytes()
-                    if leader_pc not in self.leader:
-                        self.leader[leader_pc] = True
-                        explore_leader.append(leader_pc)
-                    """ we check if control transfer instruction is PC relative.
-                        If yes, then we can determine the branch target address.
-                        That address will be another leader. """
-                    if insn.isControlTransferPCRelative():
-                        target_pc = pc + insn.immediates[0]
-                        if target_pc not in self.leader:
-                            self.leader[target_pc] = True
-                            explore_leader.append(target_pc)
-        self.createBasicBlocks()
+                first = scanned[t] == count
+                scanned[t] = i
+                if not first or not transfers[t]:
+                    continue
+                for j, u in (
+                    (following[t], followingSegments[t]),
+                    (targets[t], targetSegments[t]),
+                ):
+                    if j >= 0 and not leader[j]:
+                        leader[j] = True
+                        order.append(j)
+                        explore_leader.append((j, u))
+
+        pcs = columns["pc"].tolist()
+        self.leader = dict.fromkeys((pcs[i] for i in order), True)
+        # the leaders are the starts of the blocks
+        blockEnds = np.empty(count, dtype=np.int64)
+        blockEnds[starts] = ends
+        self.createBasicBlocksFrom(
+            [(pcs[i], pcs[j]) for i, j in zip(order, blockEnds[order].tolist())]
+        )
+        return True
 
     def printBasicBlocks(self):
         print("Basic blocks in Program: " + self.name)
@@ -274,6 +655,16 @@ class Program:
     # NOTE: you have to call createSubBlockGraph before function can be called
     def addLivenessValuesToGraph(self):
         self.visitedLive = set()
+        self.loop_backs = []
+        sub_blocks = self.getSubBlocks()
+        if len(self.cached.get("needsLive", ())) == len(sub_blocks):
+            for sub_block, needs_live, kills in zip(
+                sub_blocks, self.cached["needsLive"], self.cached["kills"]
+            ):
+                node = self.sbGraph.nodes[sub_block.name]
+                node["needs_live"] = ProgramCache.maskRegisters(needs_live)
+                node["kills"] = ProgramCache.maskRegisters(kills)
+            return
 
         # find root and run Depth First traversal from root
         N = len(self.sbbd)
@@ -300,6 +691,18 @@ class Program:
                 )
                 self.propagateLivenessUpdate(self.sbGraph, current)
 
+        nodes = [self.sbGraph.nodes[sub_block.name] for sub_block in sub_blocks]
+        self.storeCache(
+            needsLive=np.array(
+                [ProgramCache.registerMask(node["needs_live"]) for node in nodes],
+                dtype=np.uint64,
+            ),
+            kills=np.array(
+                [ProgramCache.registerMask(node["kills"]) for node in nodes],
+                dtype=np.uint64,
+            ),
+        )
+
     def needsToStayLive(self, current, register):
         """
         Returns if `register` needs to stay live from `current` subbasicblock
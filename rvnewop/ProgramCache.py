@@ -0,0 +1,156 @@
+import hashlib
+import os
+import shutil
+
+import numpy as np
+
+from . import __version__
+from .RVInstruction import RVInstruction
+
+
+class ProgramCache:
+    """An on-disk cache of parsed and analysed programs, so the same
+    histogram isn't parsed, decoded and analysed again every run
+
+    An entry is keyed by the content of the histogram file, the ISA string
+    and the rvnewop version, so it is only used while all three match. It is
+    a directory with a .npy file per array:
+        - pc, word, freq: the records of the histogram
+        - leaders: the leader PCs findBasicBlocks found, in its order
+        - needsLive, kills: per sub-block (in getSubBlocks order) bitmasks of
+          the registers in its liveness sets, by register id
+    The least recently used entries are evicted once the entries take up
+    more than maxBytes"""
+
+    # bumped when the layout of the entries changes
+    formatVersion = 2
+
+    # bytes of a histogram hashed at once
+    hashBlockSize = 1 << 20
+
+    # environment variable naming the directory of the default cache
+    environmentVariable = "RVNEWOP_CACHE"
+
+    def __init__(self, directory, maxBytes=1 << 30):
+        self.directory = directory
+        self.maxBytes = maxBytes
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def default():
+        """Returns the cache in the directory named by $RVNEWOP_CACHE,
+        or None if it isn't set"""
+        directory = os.environ.get(ProgramCache.environmentVariable)
+        return ProgramCache(directory) if directory else None
+
+    def key(self, filename, isa):
+        """Returns the key of the entry for a histogram file parsed with isa"""
+        digest = hashlib.sha256()
+        with open(filename, "rb") as infile:
+            for block in iter(lambda: infile.read(ProgramCache.hashBlockSize), b""):
+                digest.update(block)
+        digest.update(
+            "\0{}\0{}\0{}".format(isa, __version__, ProgramCache.formatVersion).encode()
+        )
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key)
+
+    def load(self, key):
+        """Returns the dict of arrays stored for key, or None if there is none"""
+        try:
+            arrays = {
+                name[: -len(".npy")]: np.load(os.path.join(self.path(key), name))
+                for name in os.listdir(self.path(key))
+                if name.endswith(".npy")
+            }
+            # entries are evicted least recently used first
+            os.utime(self.path(key))
+        except (OSError, ValueError):
+            # missing, or evicted by another process while being read
+            return None
+        return arrays or None
+
+    def store(self, key, **arrays):
+        """Adds arrays to the entry for key, replacing ones with the same name"""
+        try:
+            os.makedirs(self.path(key), exist_ok=True)
+            for name, array in arrays.items():
+                filename = os.path.join(self.path(key), name + ".npy")
+                # written beside the array then moved over it, so a reader
+                # never sees half an array
+                temporary = filename + ".{}.tmp".format(os.getpid())
+                with open(temporary, "wb") as outfile:
+                    np.save(outfile, array)
+                os.replace(temporary, filename)
+        except FileNotFoundError:
+            # evicted by another process while being written, it is only
+            # a cache so the arrays are left out
+            pass
+        self.evict()
+
+    def invalidate(self, key=None):
+        """Removes the entry for key, or every entry if key is None"""
+        keys = [key] if key is not None else self.keys()
+        for k in keys:
+            shutil.rmtree(self.path(k), ignore_errors=True)
+
+    def keys(self):
+        return [
+            name
+            for name in os.listdir(self.directory)
+            if os.path.isdir(os.path.join(self.directory, name))
+        ]
+
+    def entrySize(self, key):
+        """Returns how many bytes the entry for key takes up, 0 if there is
+        no such entry"""
+        size = 0
+        try:
+            for name in os.listdir(self.path(key)):
+                size += os.path.getsize(os.path.join(self.path(key), name))
+        except OSError:
+            # removed by another process meanwhile
+            pass
+        return size
+
+    def size(self):
+        """Returns how many bytes the entries take up"""
+        return sum(self.entrySize(key) for key in self.keys())
+
+    def evict(self):
+        """Removes the least recently used entries until the entries take up
+        at most maxBytes"""
+        entries = []
+        for key in self.keys():
+            try:
+                used = os.path.getmtime(self.path(key))
+            except OSError:
+                # removed by another process since it was listed
+                continue
+            entries.append((used, self.entrySize(key), key))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        for _, size, key in entries:
+            if total <= self.maxBytes:
+                break
+            self.invalidate(key)
+            total -= size
+
+    @staticmethod
+    def registerMask(registers):
+        """Returns a bitmask of a set of register names, by register id"""
+        mask = 0
+        for register in registers:
+            mask |= 1 << RVInstruction.registerIds[register]
+        return mask
+
+    @staticmethod
+    def maskRegisters(mask):
+        """Returns the set of register names in a bitmask, see registerMask"""
+        return {
+            name
+            for i, name in enumerate(RVInstruction.registerNames)
+            if int(mask) >> i & 1
+        }
@@ -4,67 +4,362 @@ from . import RVFormatParser
 from . import V32
 from . import C32
 from . import RVInstruction
-from bitarray import bitarray
+from . import RVEncoding
+from bitarray import bitarray, util
+from functools import lru_cache, partial
+import numpy as np
 
 
 class RV32:
     """ General class for RISC-V 32bit """
 
+    # decodeInt memos shared by every RV32 that decodes the same way,
+    # (extensions string, lazy, compressed table) --> lru_cache wrapped decodeWith
+    decodeCaches = {}
+
+    # number of instruction words each decodeInt memo holds
+    decodeCacheSize = 1 << 16
+
+    # the decodeMany columns (see instructionColumns) of every 16bit word,
+    # filled in as they are first decoded, -2 marks words not decoded yet
+    compressedColumns = None
+
+    # mnemonic id --> instruction name, ids are handed out by mnemonicId
+    # and are the same for every RV32 in the process
+    mnemonics = []
+    mnemonicIds = {}
+
+    @staticmethod
+    def mnemonicId(name):
+        """Returns the id of an instruction name, as used by decodeMany"""
+        if name not in RV32.mnemonicIds:
+            RV32.mnemonicIds[name] = len(RV32.mnemonics)
+            RV32.mnemonics.append(name)
+        return RV32.mnemonicIds[name]
+
     @staticmethod
-    def composition(f1, f2):
-        """Returns a composition of multiple instruction functions"""
+    def clearDecodeCaches():
+        """Empties every decodeInt memo, also resetting their hit/miss counters,
+        and the shared instructions they handed out (see RVInstruction.intern)"""
+        for cache in RV32.decodeCaches.values():
+            cache.cache_clear()
+        RVInstruction.flyweights.clear()
+        RV32.compressedColumns = None
 
-        def f3(ba):
-            # return first non-None value
-            return next(x for x in [f1(ba), f2(ba)] if x)
+    @staticmethod
+    def dispatch(extensions):
+        """Merges the instruction tables of each extension, opcodes decoded by
+        more than one extension are split further by funct7 so exactly one
+        decoder runs per instruction
+            extensions is a list of (name, instructionTable, intInstructionTable, claims)
+            where claims maps int opcode --> set of funct7 values the extension decodes,
+            an opcode missing from claims is decoded by that extension whatever the funct7
+        Raises ValueError if two extensions claim the same opcode and funct7
+        Returns (instructionTable, intInstructionTable), an opcode split by funct7
+        maps to a dictionary of int funct7 --> function instead of a function"""
+        # int opcode --> [(name, opcode key, function(bitarray), function(int), funct7s)]
+        claimants = {}
+        for name, table, intTable, claims in extensions:
+            for key in table:
+                opcode = util.ba2int(key)
+                claimants.setdefault(opcode, []).append(
+                    (name, key, table[key], intTable[opcode], claims.get(opcode))
+                )
+
+        instructionTable = {}
+        intInstructionTable = {}
+        for opcode, decoders in claimants.items():
+            key = decoders[0][1]
+            if len(decoders) == 1:
+                instructionTable[key] = decoders[0][2]
+                intInstructionTable[opcode] = decoders[0][3]
+                continue
+
+            instructionTable[key] = {}
+            intInstructionTable[opcode] = {}
+            for funct7 in range(1 << 7):
+                claiming = [d for d in decoders if d[4] is None or funct7 in d[4]]
+                if len(claiming) > 1:
+                    raise ValueError(
+                        "opcode {:07b} funct7 {:07b} is claimed by {}".format(
+                            opcode, funct7, " and ".join(d[0] for d in claiming)
+                        )
+                    )
+                if claiming:
+                    instructionTable[key][funct7] = claiming[0][2]
+                    intInstructionTable[opcode][funct7] = claiming[0][3]
 
-        return f3
+        return instructionTable, intInstructionTable
 
-    def __init__(self, isa="32I"):
+    @staticmethod
+    def bitarrayFallback(f, size):
+        """Wraps an instruction function taking a bitarray so it can be
+        used in the intInstructionTable"""
+
+        def f2(word):
+            return f(util.int2ba(word, size))
+
+        return f2
+
+    def __init__(
+        self,
+        isa="32I",
+        compressedTable=False,
+        compressedTableFile=None,
+        cache=True,
+        lazy=False,
+    ):
         """ A constructor for RV32
-            isa is a string containing which instruction sets and extensions to use, by default this will use 32I"""
+            isa is a string containing which instruction sets and extensions to use, by default this will use 32I
+            compressedTable makes compressed instructions decode through a dense table of all 16bit encodings
+            (see C32.getDecodeTable), compressedTableFile is where that table is cached between runs
+            cache memoizes decodeInt in a bounded LRU cache shared by every RV32 with the same extensions and options
+            lazy makes 32bit I and M instructions decode into LazyRVInstructions, which only decode
+            their operands when they are first read"""
 
         # a mapping from frozenbitarray of opcode --> function that returns an RVInstruction
+        # (or a dictionary of int funct7 --> function, see dispatch)
         self.instructionTable = {}
+        # a mapping from int opcode --> function(int) that returns an RVInstruction
+        # (or a dictionary of int funct7 --> function, see dispatch)
+        self.intInstructionTable = {}
+        # a list indexed by 16bit word --> prebuilt RVInstruction, when enabled
+        self.compressedTable = None
         self.instructionNameSet = set()
         self.registerSet = set()
+        # the extensions in use, ex: "IMC"
+        self.extensions = ""
+        self.lazy = lazy
+        # the encoding tables of the extensions that have them, see RVEncoding
+        self.encodings = ()
 
+        # (name, instructionTable, intInstructionTable, claims), see dispatch
         toAdd = []
 
         if "32I" in isa:
-            # self.instructionTable.update(I32.instructionTable)
-            toAdd.append(I32.instructionTable)
+            self.extensions += "I"
+            self.encodings += I32.encodings
+            toAdd.append(
+                (
+                    "I",
+                    I32.instructionTable,
+                    RVEncoding.compile(I32.encodings, lazy),
+                    RVEncoding.funct7Claims(I32.encodings),
+                )
+            )
             self.instructionNameSet.update(I32.instructionNameSet)
             self.registerSet.update(I32.registerSet)
         if "M" in isa:
-            # self.instructionTable.update(M32.instructionTable)
-            toAdd.append(M32.instructionTable)
+            self.extensions += "M"
+            self.encodings += M32.encodings
+            toAdd.append(
+                (
+                    "M",
+                    M32.instructionTable,
+                    RVEncoding.compile(M32.encodings, lazy),
+                    RVEncoding.funct7Claims(M32.encodings),
+                )
+            )
             self.instructionNameSet.update(M32.instructionNameSet)
         if "V" in isa:
-            # self.instructionTable.update(V32.instructionTable)
-            toAdd.append(V32.instructionTable)
-            # TODO add inst name set
-            # TODO add register set
+            self.extensions += "V"
+            intInstructionTable = {
+                util.ba2int(key): self.bitarrayFallback(V32.instructionTable[key], 32)
+                for key in V32.instructionTable
+            }
+            intInstructionTable.update(V32.intInstructionTable)
+            toAdd.append(("V", V32.instructionTable, intInstructionTable, {}))
+            self.instructionNameSet.update(V32.instructionNameSet)
+            self.registerSet.update(V32.registerSet)
         if "C" in isa:
-            # self.instructionTable.update(C32.instructionTable)
-            toAdd.append(C32.instructionTable)
+            self.extensions += "C"
+            toAdd.append(("C", C32.instructionTable, C32.intInstructionTable, {}))
             self.instructionNameSet.update(C32.instructionNameSet)
+            if compressedTable:
+                self.compressedTable = C32.getDecodeTable(compressedTableFile)
 
-            # TODO maybe use decorators or some other syntatic sugar
-            # to automate this?
+        self.instructionTable, self.intInstructionTable = RV32.dispatch(toAdd)
 
-        for table in toAdd:
-            for key in table:
-                if key in self.instructionTable:
-                    self.instructionTable[key] = self.composition(
-                        self.instructionTable[key], table[key]
+        # instances with the same extensions and options decode every word the
+        # same way, so they can share a memo of the results. The memo holds on
+        # to the tables of the first one, not the instance
+        self.decodeCache = None
+        if cache:
+            key = (self.extensions, lazy, self.compressedTable is not None)
+            if key not in RV32.decodeCaches:
+                RV32.decodeCaches[key] = lru_cache(maxsize=RV32.decodeCacheSize)(
+                    partial(
+                        RV32.decodeWith,
+                        self.intInstructionTable,
+                        self.compressedTable,
+                        lazy,
                     )
-                else:
-                    self.instructionTable[key] = table[key]
+                )
+            self.decodeCache = RV32.decodeCaches[key]
 
     def decodeHex(self, hex):
         """Decode an instruction encoded in hexadecimal
         Returns RVInstruction"""
+        return self.decodeInt(int(hex, 16))
+
+    def decodeInt(self, word):
+        """Decode an instruction word given as an int, going through the
+        shared decode cache when it is enabled.
+        The returned RVInstruction may be shared and must not be modified
+        Returns RVInstruction"""
+        if self.decodeCache is not None:
+            return self.decodeCache(word)
+        return self.decodeIntUncached(word)
+
+    def cacheInfo(self):
+        """Returns the hits, misses, maxsize and currsize of this instance's
+        decode cache (None when caching is disabled)"""
+        if self.decodeCache is None:
+            return None
+        return self.decodeCache.cache_info()
+
+    def decodeIntUncached(self, word):
+        """Decode an instruction word given as an int, the opcode and
+        operands are pulled out with shifts and masks rather than a bitarray
+        Returns RVInstruction"""
+        return RV32.decodeWith(
+            self.intInstructionTable, self.compressedTable, self.lazy, word
+        )
+
+    @staticmethod
+    def decodeWith(intInstructionTable, compressedTable, lazy, word):
+        """decodeIntUncached given the tables and options of an RV32,
+        so a shared memo of it doesn't keep the RV32 alive"""
+        # compressed instructions NEVER end in 11
+        if word & 0b11 == 0b11:
+            size = 32
+            opcode = RVFormatParser.getOpcode_int(word)
+        else:
+            size = 16
+            opcode = RVFormatParser.getCOpcode_int(word)
+
+        if word >> size:
+            # too wide to be a single instruction
+            return RVInstruction(rv_name="error", rv_size=size)
+
+        if size == 16 and compressedTable is not None:
+            inst = compressedTable[word]
+            # False marks encodings that raise, decode those below
+            if inst is not False:
+                return inst
+
+        f = intInstructionTable.get(opcode)
+        if f is None:
+            return RVInstruction(rv_name="error", rv_size=size)
+        if type(f) is dict:
+            # an opcode shared by several extensions
+            f = f.get(RVFormatParser.getFunct7_int(word))
+            if f is None:
+                return None
+        if lazy:
+            # interning would decode the operands
+            return f(word)
+        return RVInstruction.intern(f(word))
+
+    def decodeMany(self, words):
+        """Decode an array of instruction words at once
+
+        words is a numpy array of uint32 (or anything numpy.asarray takes).
+        The fields of the 32bit instructions in the encoding tables (I and M)
+        are pulled out with shifts and masks over the whole array, compressed
+        words are looked up in a table of every 16bit word, filled in as the
+        words are first seen. Anything else (ex: V) is decoded with decodeInt,
+        once per distinct word.
+        Returns a dict of numpy arrays, one entry per word:
+            - opcode: the major opcode (the low 7 bits, or 2 bits if compressed)
+            - mnemonic: the instruction name as an id into RV32.mnemonics,
+              -1 when the word could not be decoded
+            - rd: the first destination register (see RVInstruction.registerId), -1 if none
+            - rs1, rs2: the first and second source registers, -1 if none
+            - imm: the first immediate, 0 if none
+            - size: the size of the instruction in bytes"""
+        words = np.asarray(words, dtype=np.uint32)
+        unique, inverse = np.unique(words, return_inverse=True)
+
+        # mnemonic, rd, rs1, rs2 and imm of each distinct word
+        columns = np.full((5, len(unique)), -1, dtype=np.int64)
+        columns[4] = 0
+        left = np.ones(len(unique), dtype=bool)
+
+        # the operand builders only use shifts and masks, so given an array
+        # of words they build an instruction whose fields are arrays
+        wide = unique.astype(np.int64)
+        full = wide & 0b11 == 0b11
+        opcodes = set(np.unique(RVFormatParser.getOpcode_int(wide[full])).tolist())
+        for name, match, mask, operands in self.encodings:
+            if RVFormatParser.getOpcode_int(match) not in opcodes:
+                continue
+            hit = left & full & (wide & mask == match)
+            if not hit.any():
+                continue
+            left &= ~hit
+            inst = RVEncoding.formats[operands](name, wide[hit])
+            for row, values in enumerate(RV32.instructionColumns(inst)):
+                columns[row, hit] = values
+
+        compressed = left & ~full
+        if "C" in self.extensions and compressed.any():
+            if RV32.compressedColumns is None:
+                RV32.compressedColumns = np.full((5, 1 << 16), -2, dtype=np.int64)
+            table = RV32.compressedColumns
+            halfwords = wide[compressed]
+            for word in np.unique(halfwords[table[0, halfwords] == -2]).tolist():
+                table[:, word] = RV32.instructionColumns(self.decodeSafely(word))
+            columns[:, compressed] = table[:, halfwords]
+            left &= ~compressed
+
+        for i in np.flatnonzero(left).tolist():
+            columns[:, i] = RV32.instructionColumns(
+                self.decodeSafely(int(unique[i]))
+            )
+
+        # compressed instructions NEVER end in 11
+        full = words & 0b11 == 0b11
+        return {
+            "opcode": np.where(
+                full,
+                RVFormatParser.getOpcode_int(words),
+                RVFormatParser.getCOpcode_int(words),
+            ).astype(np.uint8),
+            "mnemonic": columns[0].astype(np.int32)[inverse],
+            "rd": columns[1].astype(np.int8)[inverse],
+            "rs1": columns[2].astype(np.int8)[inverse],
+            "rs2": columns[3].astype(np.int8)[inverse],
+            "imm": columns[4][inverse],
+            "size": np.where(full, 4, 2).astype(np.uint8),
+        }
+
+    def decodeSafely(self, word):
+        """decodeInt, but None for the words it raises on"""
+        try:
+            return self.decodeInt(word)
+        except Exception:
+            return None
+
+    @staticmethod
+    def instructionColumns(inst):
+        """Returns the decodeMany columns (mnemonic, rd, rs1, rs2, imm) of an
+        instruction, or of an instruction of arrays made by an operand
+        builder (see RVEncoding.formats)"""
+        if inst is None:
+            return (-1, -1, -1, -1, 0)
+        registers = list(inst.dest_ids[:1]) or [-1]
+        registers += list(inst.src_ids[:2]) + [-1] * (2 - len(inst.src_ids[:2]))
+        immediates = inst.immediates
+        immediate = 0
+        if immediates and isinstance(immediates[0], (int, np.ndarray)):
+            immediate = immediates[0]
+        return (RV32.mnemonicId(inst.name), *registers, immediate)
+
+    def decodeHexBitarray(self, hex):
+        """Decode an instruction encoded in hexadecimal by way of a bitarray,
+        this is the reference decoder that decodeInt is checked against
+        Returns RVInstruction"""
         bstr = bitarray(bin(int(hex, 16))[2:]).to01()
         size = 32
 
@@ -80,7 +375,11 @@ class RV32:
     def decode(self, ba, size):
         """Decode an instruction encoded in binary as a bitarray
         Returns RVInstruction"""
-        return self.instructionTable.get(
+        f = self.instructionTable.get(
             RVFormatParser.getOpcode(ba),
             lambda x: RVInstruction(rv_name="error", rv_size=size),
-        )(ba)
+        )
+        if type(f) is dict:
+            # an opcode shared by several extensions
+            f = f.get(util.ba2int(RVFormatParser.getFunct7(ba)), lambda x: None)
+        return f(ba)
@@ -0,0 +1,192 @@
+from . import RVFormatParser as fp
+from . import RVInstruction
+from . import LazyRVInstruction
+
+
+class DecodeNode:
+    """A node of a compiled decode tree, children are picked by one field
+    of the instruction word, (word >> shift) & mask"""
+
+    def __init__(self, shift, mask, children):
+        self.shift = shift
+        self.mask = mask
+        self.children = children
+
+
+class RVEncoding:
+    """Compiles declarative encoding tables into decoders
+
+    An encoding table is a sequence of (name, match, mask, operand format)
+    entries, an instruction word is the named instruction when
+    word & mask == match, the same numbers riscv-opcodes and spike's
+    encoding.h use. The operand format says how to pull out the operands,
+    see RVEncoding.formats, None marks instructions that are recognised but
+    decoded as 'unsupported'"""
+
+    # the fields a 32bit decode tree branches on after the opcode, in order,
+    # as (shift, mask): funct3 then funct7
+    treeFields = ((12, 0b111), (25, 0b1111111))
+
+    # (encoding table, lazy) --> compiled opcode table, see RVEncoding.compile
+    compiled = {}
+
+    # Operand builders
+    # function(name, word) --> RVInstruction, one per operand format
+
+    @staticmethod
+    def buildR(name, word):
+        rd, rs1, rs2 = fp.parseR_int(word)
+        return RVInstruction.fromIds("R", name, 32, word, (rs1, rs2), (rd,))
+
+    @staticmethod
+    def buildI(name, word):
+        rd, rs1, imm = fp.parseI_int(word)
+        return RVInstruction.fromIds("I", name, 32, word, (rs1,), (rd,), (imm,))
+
+    @staticmethod
+    def buildShift(name, word):
+        # the shamt is read as the low 6 bits of the immediate, signed,
+        # which is what I32.IMMEDIATE does
+        rd, rs1, imm = fp.parseI_int(word)
+        shamt = ((imm & 0x3F) ^ 0x20) - 0x20
+        return RVInstruction.fromIds("I", name, 32, word, (rs1,), (rd,), (shamt,))
+
+    @staticmethod
+    def buildS(name, word):
+        rs1, rs2, imm = fp.parseS_int(word)
+        return RVInstruction.fromIds("S", name, 32, word, (rs1, rs2), (), (imm,))
+
+    @staticmethod
+    def buildB(name, word):
+        rs1, rs2, imm = fp.parseB_int(word)
+        return RVInstruction.fromIds("B", name, 32, word, (rs1, rs2), (), (imm,))
+
+    @staticmethod
+    def buildU(name, word):
+        rd, imm = fp.parseU_int(word)
+        return RVInstruction.fromIds("U", name, 32, word, (), (rd,), (imm,))
+
+    @staticmethod
+    def buildJ(name, word):
+        rd, imm = fp.parseJ_int(word)
+        return RVInstruction.fromIds("J", name, 32, word, (), (rd,), (imm,))
+
+    @staticmethod
+    def buildUnsupported(name, word):
+        return RVInstruction.fromIds("", "unsupported", 32, word)
+
+    # operand format --> operand builder
+    formats = {
+        "R": buildR.__func__,
+        "I": buildI.__func__,
+        "I_SHAMT": buildShift.__func__,
+        "S": buildS.__func__,
+        "B": buildB.__func__,
+        "U": buildU.__func__,
+        "J": buildJ.__func__,
+        None: buildUnsupported.__func__,
+    }
+
+    @staticmethod
+    def compileNode(entries, fields):
+        """Builds the decode tree for entries that share an opcode,
+        branching on each field some entry's mask covers
+        Returns a DecodeNode, or a tuple of entries once out of fields"""
+        if not fields:
+            return tuple(entries)
+
+        shift, fieldMask = fields[0]
+        if not any(entry[2] >> shift & fieldMask for entry in entries):
+            # nothing looks at this field
+            return RVEncoding.compileNode(entries, fields[1:])
+
+        children = {}
+        for value in range(fieldMask + 1):
+            matching = [
+                entry
+                for entry in entries
+                if (value ^ entry[1] >> shift) & entry[2] >> shift & fieldMask == 0
+            ]
+            if matching:
+                children[value] = RVEncoding.compileNode(matching, fields[1:])
+        return DecodeNode(shift, fieldMask, children)
+
+    @staticmethod
+    def decoder(tree, lazy=False):
+        """Returns a function(int) --> RVInstruction walking a decode tree,
+        if lazy it returns LazyRVInstructions instead"""
+
+        def f(word):
+            node = tree
+            while type(node) is DecodeNode:
+                node = node.children.get(word >> node.shift & node.mask)
+                if node is None:
+                    return None
+
+            # the last few fields are checked against the whole mask
+            for name, match, mask, build, rv_format in node:
+                if word & mask == match:
+                    if lazy and rv_format:
+                        return LazyRVInstruction(rv_format, name, 32, word, build)
+                    return build(name, word)
+            return None
+
+        return f
+
+    @staticmethod
+    def compile(encodings, lazy=False):
+        """Compiles an encoding table of 32bit instructions, each table is
+        only compiled once per process
+        Returns a dictionary of int opcode --> function(int) --> RVInstruction
+        (LazyRVInstruction if lazy)"""
+        if (encodings, lazy) not in RVEncoding.compiled:
+            RVEncoding.compiled[encodings, lazy] = RVEncoding.compileTable(
+                encodings, lazy
+            )
+        return RVEncoding.compiled[encodings, lazy]
+
+    @staticmethod
+    def compileTable(encodings, lazy):
+        byOpcode = {}
+        for name, match, mask, operands in encodings:
+            # the builders for I_SHAMT make format I instructions
+            rv_format = operands[0] if operands else ""
+            byOpcode.setdefault(match & 0x7F, []).append(
+                (name, match, mask, RVEncoding.formats[operands], rv_format)
+            )
+
+        return {
+            opcode: RVEncoding.decoder(
+                RVEncoding.compileNode(entries, RVEncoding.treeFields), lazy
+            )
+            for opcode, entries in byOpcode.items()
+        }
+
+    @staticmethod
+    def funct7Claims(encodings):
+        """Returns a dictionary of int opcode --> set of the funct7 values an
+        encoding table decodes, for the opcodes where every entry fixes funct7
+        (see RV32.dispatch)"""
+        claims = {}
+        anyFunct7 = set()
+        for name, match, mask, operands in encodings:
+            opcode = match & 0x7F
+            if mask >> 25 != 0x7F:
+                anyFunct7.add(opcode)
+            claims.setdefault(opcode, set()).add(match >> 25)
+
+        return {
+            opcode: frozenset(funct7s)
+            for opcode, funct7s in claims.items()
+            if opcode not in anyFunct7
+        }
+
+    @staticmethod
+    def find(name, encodings):
+        """Returns the (name, match, mask, operand format) entry of an
+        instruction, or None if no table has it"""
+        for table in encodings:
+            for entry in table:
+                if entry[0] == name:
+                    return entry
+        return None
@@ -68,6 +68,121 @@ class RVFormatParser:
         """Converts imm bitarray into unsigned integer"""
         return int(bitarray(imm).to01(), 2)
 
+    # Integer helper methods
+    # These pull fields out of an instruction word held in a plain int,
+    # so the decodeInt path never has to build a bitarray
+
+    @staticmethod
+    def getOpcode_int(word):
+        """ Returns the opcode of a 32bit instruction word """
+        return word & 0x7F
+
+    @staticmethod
+    def getCOpcode_int(word):
+        """ Returns the opcode (quadrant) of a 16bit instruction word """
+        return word & 0x3
+
+    @staticmethod
+    def getRD_int(word):
+        """ Returns the destination register number of an instruction word """
+        return (word >> 7) & 0x1F
+
+    @staticmethod
+    def getFunct3_int(word):
+        """ Returns the funct3 of an instruction word """
+        return (word >> 12) & 0x7
+
+    @staticmethod
+    def getRS1_int(word):
+        """ Returns the first source register number of an instruction word """
+        return (word >> 15) & 0x1F
+
+    @staticmethod
+    def getRS2_int(word):
+        """ Returns the second source register number of an instruction word """
+        return (word >> 20) & 0x1F
+
+    @staticmethod
+    def getFunct7_int(word):
+        """ Returns the funct7 of an instruction word """
+        return (word >> 25) & 0x7F
+
+    # Integer parsers
+    # Like parseR, parseI, ... but for a 32bit instruction word held in an int,
+    # they return a tuple of register numbers and the sign extended immediate
+
+    @staticmethod
+    def parseR_int(word):
+        """ Returns (rd, rs1, rs2) of an R format instruction word """
+        return (
+            RVFormatParser.getRD_int(word),
+            RVFormatParser.getRS1_int(word),
+            RVFormatParser.getRS2_int(word),
+        )
+
+    @staticmethod
+    def parseI_int(word):
+        """ Returns (rd, rs1, imm) of an I format instruction word """
+        return (
+            RVFormatParser.getRD_int(word),
+            RVFormatParser.getRS1_int(word),
+            ((word >> 20 & 0xFFF) ^ 0x800) - 0x800,
+        )
+
+    @staticmethod
+    def parseS_int(word):
+        """ Returns (rs1, rs2, imm) of an S format instruction word """
+        return (
+            RVFormatParser.getRS1_int(word),
+            RVFormatParser.getRS2_int(word),
+            ((word >> 20 & 0xFE0 | word >> 7 & 0x1F) ^ 0x800) - 0x800,
+        )
+
+    @staticmethod
+    def parseB_int(word):
+        """ Returns (rs1, rs2, imm) of a B format instruction word """
+        return (
+            RVFormatParser.getRS1_int(word),
+            RVFormatParser.getRS2_int(word),
+            (
+                (
+                    word >> 19 & 0x1000
+                    | word << 4 & 0x800
+                    | word >> 20 & 0x7E0
+                    | word >> 7 & 0x1E
+                )
+                ^ 0x1000
+            )
+            - 0x1000,
+        )
+
+    @staticmethod
+    def parseU_int(word):
+        """ Returns (rd, imm) of a U format instruction word, imm is unsigned """
+        return RVFormatParser.getRD_int(word), word >> 12 & 0xFFFFF
+
+    @staticmethod
+    def parseJ_int(word):
+        """ Returns (rd, imm) of a J format instruction word """
+        return (
+            RVFormatParser.getRD_int(word),
+            (
+                (
+                    word >> 11 & 0x100000
+                    | word & 0xFF000
+                    | word >> 9 & 0x800
+                    | word >> 20 & 0x7FE
+                )
+                ^ 0x100000
+            )
+            - 0x100000,
+        )
+
+    @staticmethod
+    def getCFunct3_int(word):
+        """ Returns funct3 of a 16bit instruction word """
+        return (word >> 13) & 0x7
+
     # Compressed Helper methods
     # These help parse 16bit instructions
 
@@ -1,6 +1,106 @@
+import weakref
+
+from bitarray import bitarray, util
+
+
 class RVInstruction:
     """A class to represent any RISC-V Instruction"""
 
+    __slots__ = (
+        "format",
+        "_src_ids",
+        "_dest_ids",
+        "_immediates",
+        "_mask",
+        "name",
+        "size",
+        "binary",
+        "flags",
+        # so the flyweights don't keep instructions alive, see intern
+        "__weakref__",
+    )
+
+    # Instruction class flags
+    # bits of RVInstruction.flags, see nameFlags
+    BRANCH = 1 << 0
+    JUMP = 1 << 1
+    JUMP_PC_RELATIVE = 1 << 2
+    LOAD = 1 << 3
+    STORE = 1 << 4
+    WRITES_RD = 1 << 5
+    CONTROL_TRANSFER = BRANCH | JUMP
+    CONTROL_TRANSFER_PC_RELATIVE = BRANCH | JUMP_PC_RELATIVE
+    MEM_ACCESS = LOAD | STORE
+
+    jumpNames = {"j", "jal", "jalr", "jr", "c.j", "c.jal", "c.jalr", "c.jr"}
+    jumpPCRelativeNames = {"j", "jal", "c.j", "c.jal"}
+    branchNames = {
+        "beq",
+        "bne",
+        "blt",
+        "bltu",
+        "bge",
+        "bgeu",
+        "beqz",
+        "bnez",
+        "blez",
+        "bgez",
+        "bltz",
+        "bgtz",
+        "bgt",
+        "ble",
+        "bgtu",
+        "bleu",
+        "c.beqz",
+        "c.bnez",
+    }
+    loadNames = {
+        "c.fld",
+        "c.lq",
+        "c.lw",
+        "c.flw",
+        "c.ld",
+        "c.fldsp",
+        "c.lwsp",
+        "c.flwsp",
+        "c.ldsp",
+        "lb",
+        "lh",
+        "lw",
+        "lbu",
+        "lhu",
+        "ld",
+        "lwu",
+    }
+    storeNames = {
+        "c.fsd",
+        "c.sq",
+        "c.sw",
+        "c.fsw",
+        "c.sd",
+        "c.fsdsp",
+        "c.swsp",
+        "c.fswsp",
+        "c.sdsp",
+        "sb",
+        "sh",
+        "sw",
+        "sd",
+    }
+
+    # instruction name --> class flags, filled in by nameFlags
+    flagsByName = {}
+
+    # register id --> register name, see registerId
+    registerNames = tuple("x{}".format(i) for i in range(32)) + tuple(
+        "v{}".format(i) for i in range(32)
+    )
+    registerIds = {name: i for i, name in enumerate(registerNames)}
+
+    # (name, format, size, binary, registers, immediates, mask) --> shared RVInstruction, see intern,
+    # an instruction drops out once nothing else refers to it
+    flyweights = weakref.WeakValueDictionary()
+
     def __init__(
         self,
         rv_format=None,
@@ -11,7 +111,6 @@ class RVInstruction:
         rv_name=None,
         rv_size=None,
         rv_binary=None,
-        rv_freq=None,
     ):
         """Constructs a RV Instruction based on parameters
 
@@ -22,17 +121,167 @@ class RVInstruction:
             - mask: a vector instruction is masked if it does not modify the destination vector register element and never generates exceptions
             - name: the readable name of the instruction (i.e. addi, jal, beq, etc)
             - size: the size of the instruction in bits
-            - binary: the original binary representation of the instruction
+            - binary: the original binary representation of the instruction, kept as the instruction word in an int
+              (a bitarray is converted)
+
+        Instructions can be shared between PCs, so they have no frequency,
+        a Program keeps those by PC (Program.frequencies)
+
+        Registers are stored as ids (src_ids and dest_ids, see registerId) and the lists as tuples,
+        src_registers, dest_registers, immediates and mask hand back new lists
         """
         self.format = rv_format if rv_format is not None else ""
-        self.src_registers = rv_src_registers if rv_src_registers is not None else []
-        self.dest_registers = rv_dest_registers if rv_dest_registers is not None else []
-        self.immediates = rv_immediates if rv_immediates is not None else []
-        self.mask = rv_mask if rv_mask is not None else []
+        self._src_ids = self.toRegisterIds(rv_src_registers)
+        self._dest_ids = self.toRegisterIds(rv_dest_registers)
+        self._immediates = tuple(rv_immediates) if rv_immediates is not None else ()
+        self._mask = tuple(rv_mask) if rv_mask is not None else ()
         self.name = rv_name if rv_name is not None else ""
         self.size = rv_size if rv_size is not None else 0
+        if isinstance(rv_binary, bitarray):
+            rv_binary = util.ba2int(rv_binary)
         self.binary = rv_binary if rv_binary is not None else ""
-        self.freq = rv_freq if rv_freq is not None else 0
+        self.flags = RVInstruction.nameFlags(self.name)
+        if self._dest_ids:
+            self.flags |= RVInstruction.WRITES_RD
+
+    @staticmethod
+    def fromIds(
+        rv_format,
+        rv_name,
+        rv_size,
+        rv_binary,
+        src_ids=(),
+        dest_ids=(),
+        immediates=(),
+        mask=(),
+    ):
+        """Constructs an RVInstruction from register ids and tuples, skipping
+        the conversions of the constructor, for the int decoders"""
+        inst = RVInstruction.__new__(RVInstruction)
+        inst.format = rv_format
+        inst._src_ids = src_ids
+        inst._dest_ids = dest_ids
+        inst._immediates = immediates
+        inst._mask = mask
+        inst.name = rv_name
+        inst.size = rv_size
+        inst.binary = rv_binary
+        inst.flags = RVInstruction.nameFlags(rv_name)
+        if dest_ids:
+            inst.flags |= RVInstruction.WRITES_RD
+        return inst
+
+    def fields(self):
+        """Returns the fields of the instruction as a tuple, so it can be sent
+        to another process and rebuilt there with fromFields"""
+        return (
+            self.format,
+            self.name,
+            self.size,
+            self.binary,
+            self._src_ids,
+            self._dest_ids,
+            self._immediates,
+            self._mask,
+            self.flags,
+        )
+
+    @staticmethod
+    def fromFields(fields):
+        """Returns the RVInstruction of the fields of one, see fields"""
+        inst = RVInstruction.fromIds(*fields[:-1])
+        inst.flags = fields[-1]
+        return inst
+
+    @staticmethod
+    def nameFlags(name):
+        """Returns the class flags of an instruction name (all but WRITES_RD),
+        worked out once per name"""
+        flags = RVInstruction.flagsByName.get(name)
+        if flags is None:
+            flags = 0
+            if name in RVInstruction.branchNames:
+                flags |= RVInstruction.BRANCH
+            if name in RVInstruction.jumpNames:
+                flags |= RVInstruction.JUMP
+            if name in RVInstruction.jumpPCRelativeNames:
+                flags |= RVInstruction.JUMP_PC_RELATIVE
+            if name in RVInstruction.loadNames:
+                flags |= RVInstruction.LOAD
+            if name in RVInstruction.storeNames:
+                flags |= RVInstruction.STORE
+            RVInstruction.flagsByName[name] = flags
+        return flags
+
+    @staticmethod
+    def toRegisterIds(register_names):
+        """Returns a tuple of register ids for a list of register names"""
+        if not register_names:
+            return ()
+        return tuple(RVInstruction.registerIds[x] for x in register_names)
+
+    @property
+    def src_ids(self):
+        return self._src_ids
+
+    @property
+    def dest_ids(self):
+        return self._dest_ids
+
+    @property
+    def src_registers(self):
+        return [RVInstruction.registerNames[i] for i in self._src_ids]
+
+    @src_registers.setter
+    def src_registers(self, register_names):
+        self._src_ids = self.toRegisterIds(register_names)
+
+    @property
+    def dest_registers(self):
+        return [RVInstruction.registerNames[i] for i in self._dest_ids]
+
+    @dest_registers.setter
+    def dest_registers(self, register_names):
+        self._dest_ids = self.toRegisterIds(register_names)
+        if self._dest_ids:
+            self.flags |= RVInstruction.WRITES_RD
+        else:
+            self.flags &= ~RVInstruction.WRITES_RD
+
+    @property
+    def immediates(self):
+        return list(self._immediates)
+
+    @immediates.setter
+    def immediates(self, immediates):
+        self._immediates = tuple(immediates)
+
+    @property
+    def mask(self):
+        return list(self._mask)
+
+    @mask.setter
+    def mask(self, mask):
+        self._mask = tuple(mask)
+
+    @staticmethod
+    def intern(inst):
+        """Returns the one shared RVInstruction with the same fields as inst,
+        so identical decodes are only kept in memory once.
+        Shared instances must not be modified"""
+        if inst is None:
+            return None
+        key = (
+            inst.name,
+            inst.format,
+            inst.size,
+            inst.binary,
+            inst._src_ids,
+            inst._dest_ids,
+            inst._immediates,
+            inst._mask,
+        )
+        return RVInstruction.flyweights.setdefault(key, inst)
 
     @staticmethod
     def get_print_name(register_name):
@@ -69,82 +318,47 @@ class RVInstruction:
         # also vector registers
         return register_name
 
+    @staticmethod
+    def registerId(register_name):
+        """Returns a small int standing for a register name,
+        x0 - x31 are 0 - 31 and v0 - v31 are 32 - 63"""
+        return RVInstruction.registerIds[register_name]
+
+    @staticmethod
+    def registerName(register_id):
+        """Returns the register name for an id given by registerId"""
+        return RVInstruction.registerNames[register_id]
+
     def sizeInBytes(self):
         return int(self.size / 8)
 
     def isJump(self):
-        return self.name in ["j", "jal", "jalr", "jr", "c.j", "c.jal", "c.jalr", "c.jr"]
+        return bool(self.flags & RVInstruction.JUMP)
 
     def isJumpPCRelative(self):
-        return self.name in ["j", "jal", "c.j", "c.jal"]
+        return bool(self.flags & RVInstruction.JUMP_PC_RELATIVE)
 
     def isBranch(self):
-        return self.name in [
-            "beq",
-            "bne",
-            "blt",
-            "bltu",
-            "bge",
-            "bgeu",
-            "beqz",
-            "bnez",
-            "blez",
-            "bgez",
-            "bltz",
-            "bgtz",
-            "bgt",
-            "ble",
-            "bgtu",
-            "bleu",
-            "c.beqz",
-            "c.bnez",
-        ]
+        return bool(self.flags & RVInstruction.BRANCH)
 
     def isControlTransfer(self):
-        return self.isJump() or self.isBranch()
+        return bool(self.flags & RVInstruction.CONTROL_TRANSFER)
 
     def isControlTransferPCRelative(self):
-        return self.isJumpPCRelative() or self.isBranch()
+        return bool(self.flags & RVInstruction.CONTROL_TRANSFER_PC_RELATIVE)
 
     def isLoad(self):
-        return self.name in [
-            "c.fld",
-            "c.lq",
-            "c.lw",
-            "c.flw",
-            "c.ld",
-            "c.fldsp",
-            "c.lwsp",
-            "c.flwsp",
-            "c.ldsp",
-            "lb",
-            "lh",
-            "lw",
-            "lbu",
-            "lhu",
-            "ld",
-            "lwu",
-        ]
+        return bool(self.flags & RVInstruction.LOAD)
 
     def isStore(self):
-        return self.name in [
-            "c.fsd",
-            "c.sq",
-            "c.sw",
-            "c.fsw",
-            "c.sd",
-            "c.fsdsp",
-            "c.swsp",
-            "c.fswsp",
-            "c.sdsp",
-            "sb",
-            "sh",
-            "sw",
-            "sd",
-        ]
+        return bool(self.flags & RVInstruction.STORE)
 
     def isMemAccess(self):
-        return self.isLoad() or self.isStore()
+        return bool(self.flags & RVInstruction.MEM_ACCESS)
+
+    def writesRd(self):
+        """True if the instruction has a destination register"""
+        return bool(self.flags & RVInstruction.WRITES_RD)
 
     def __str__(self):
         """Create a printable string from Instruction"""
@@ -16,7 +16,7 @@ class Subgraph:
         # another note: since these subgraphs come from the same basic block,
         #               all instructions in it are guaranteed to have the same
         #               frequency as all the rest
-        self.score = (
+        self.saved = (
             len(graph.nodes)
             - len(
                 [
@@ -26,7 +26,8 @@ class Subgraph:
                 ]
             )
             - 1
-        ) * graph.nodes[root]["instruction"].freq
+        )
+        self.updateScore()
 
         self.depth = self.calcDepth(self.root)
 
@@ -36,6 +37,11 @@ class Subgraph:
         ]
         self.imm_range = (min(immediates), max(immediates)) if immediates else None
 
+    def updateScore(self):
+        """Sets the score from the root's current frequency, ex: after
+        Program.updateFrequencies marked the sub-block of the graph dirty"""
+        self.score = self.saved * self.graph.nodes[self.root]["freq"]
+
     def calcDepth(self, current):
         """Calculate the depth of a DAG recursively"""
         if len(list(self.graph.successors(current))) == 0:
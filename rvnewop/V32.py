@@ -2,6 +2,7 @@ from bitarray import bitarray, frozenbitarray
 
 from . import RVFormatParser as fp
 from . import RVInstruction
+from .RVEncoding import DecodeNode
 
 
 class V32:
@@ -1351,6 +1352,386 @@ class V32:
                     rv_binary=ba,
                 )
 
+    # Table driven OP-V decoding
+    # OP_V_int decodes the same instructions as OP_V straight from an int,
+    # with one lookup on (funct3, funct6) into opVTable
+
+    # operand flags
+    SWAP = 1  # sources are listed vs2 first
+    NO_VS1 = 2  # the vs1/rs1 field selects the instruction
+    NO_VS2 = 4  # the vs2 field selects the instruction
+    NO_SRC = 8  # there are no source registers
+    RD = 16  # the destination is the integer register rd
+
+    # the masks of an instruction as (vm bit clear, vm bit set)
+    MASK_VM = (("v0.t",), ())
+    MASK_V0 = (("v0",), ("v0",))
+    NO_MASK = ((), ())
+
+    # funct3 --> (format, vs1 field read as "v"ector, "x" integer or
+    # "i"mmediate, flags the format honours)
+    opVFormats = {
+        0b000: ("OPIVV", "v", SWAP | NO_VS2),
+        0b001: ("OPFVV", "v", SWAP | NO_VS1 | NO_SRC | RD),
+        0b010: ("OPMVV", "v", SWAP | NO_VS1 | NO_SRC | RD),
+        0b011: ("OPIVI", "i", NO_VS2),
+        0b100: ("OPIVX", "x", SWAP | NO_VS2),
+        0b101: ("OPFVF", "x", SWAP | NO_VS2),
+        0b110: ("OPMVX", "x", SWAP | NO_VS2 | RD),
+    }
+
+    # funct3 --> mnemonic suffix of the usual .vv/.vx/.vi variants
+    operandSuffixes = {
+        0b000: ".vv",
+        0b001: ".vv",
+        0b010: ".vv",
+        0b011: ".vi",
+        0b100: ".vx",
+        0b101: ".vf",
+        0b110: ".vx",
+    }
+
+    # operand variant --> (suffix, or funct3 --> suffix, flags, mask)
+    opVVariants = {
+        "op": (operandSuffixes, SWAP, MASK_VM),
+        # multiply-adds list vs1/rs1 first
+        "fma": (operandSuffixes, 0, MASK_VM),
+        "red": (".vs", SWAP, MASK_VM),
+        "widen": ({0b001: "v", 0b010: "v", 0b101: "f", 0b110: "x"}, SWAP, MASK_VM),
+        "carry": ({0b000: ".vvm", 0b011: ".vim", 0b100: ".vxm"}, SWAP, MASK_V0),
+        "mask": (".vm", SWAP, NO_MASK),
+        "mm": (".mm", SWAP, NO_MASK),
+        "mv": ({0b000: ".v.v", 0b011: ".v.i", 0b100: ".v.x"}, NO_VS2, NO_MASK),
+        # the name is the whole mnemonic
+        "merge": ("", SWAP, MASK_V0),
+        "move": ("", NO_VS2, NO_MASK),
+        "toscalar": ("", NO_VS1 | RD, NO_MASK),
+        "toscalar_m": ("", NO_VS1 | RD, MASK_VM),
+        "unary": ("", NO_VS1, MASK_VM),
+        "nullary": ("", NO_SRC, MASK_VM),
+    }
+
+    OPI = (0b000, 0b011, 0b100)
+    OPM = (0b010, 0b110)
+    OPF = (0b001, 0b101)
+
+    # (funct3s, funct6, name, operand variant)
+    opVEncodings = (
+        (OPI, 0x00, "vadd", "op"),
+        (OPI, 0x02, "vsub", "op"),
+        (OPI, 0x03, "vrsub", "op"),
+        (OPI, 0x04, "vminu", "op"),
+        (OPI, 0x05, "vmin", "op"),
+        (OPI, 0x06, "vmaxu", "op"),
+        (OPI, 0x07, "vmax", "op"),
+        (OPI, 0x09, "vand", "op"),
+        (OPI, 0x0A, "vor", "op"),
+        (OPI, 0x0B, "vxor", "op"),
+        (OPI, 0x0C, "vrgather", "op"),
+        (OPI, 0x0E, "vslideup", "op"),
+        (OPI, 0x0F, "vslidedown", "op"),
+        (OPI, 0x10, "vadc", "carry"),
+        (OPI, 0x11, "vmadc", "carry"),
+        (OPI, 0x12, "vsbc", "carry"),
+        (OPI, 0x13, "vmsbc", "carry"),
+        (OPI, 0x18, "vmseq", "op"),
+        (OPI, 0x19, "vmsne", "op"),
+        (OPI, 0x1A, "vmsltu", "op"),
+        (OPI, 0x1B, "vmslt", "op"),
+        (OPI, 0x1C, "vmsleu", "op"),
+        (OPI, 0x1D, "vmsle", "op"),
+        (OPI, 0x1E, "vmsgtu", "op"),
+        (OPI, 0x1F, "vmsgt", "op"),
+        (OPI, 0x20, "vsaddu", "op"),
+        (OPI, 0x21, "vsadd", "op"),
+        (OPI, 0x22, "vssubu", "op"),
+        (OPI, 0x23, "vssub", "op"),
+        (OPI, 0x24, "vaadd", "op"),
+        (OPI, 0x25, "vsll", "op"),
+        (OPI, 0x26, "vasub", "op"),
+        (OPI, 0x27, "vsmul", "op"),
+        (OPI, 0x28, "vsrl", "op"),
+        (OPI, 0x29, "vsra", "op"),
+        (OPI, 0x2A, "vssrl", "op"),
+        (OPI, 0x2B, "vssra", "op"),
+        (OPI, 0x2C, "vnsrl", "op"),
+        (OPI, 0x2D, "vnsra", "op"),
+        (OPI, 0x2E, "vnclipu", "op"),
+        (OPI, 0x2F, "vnclip", "op"),
+        (OPI, 0x30, "vwredsumu", "red"),
+        (OPI, 0x31, "vwredsum", "red"),
+        (OPI, 0x38, "vdotu", "op"),
+        (OPI, 0x39, "vdot", "op"),
+        (OPI, 0x3C, "vwsmaccu", "fma"),
+        (OPI, 0x3D, "vwsmacc", "fma"),
+        (OPI, 0x3E, "vwsmaccus", "fma"),
+        (OPI, 0x3F, "vwsmaccsu", "fma"),
+        (OPM, 0x00, "vredsum", "red"),
+        (OPM, 0x01, "vredand", "red"),
+        (OPM, 0x02, "vredor", "red"),
+        (OPM, 0x03, "vredxor", "red"),
+        (OPM, 0x04, "vredminu", "red"),
+        (OPM, 0x05, "vredmin", "red"),
+        (OPM, 0x06, "vredmaxu", "red"),
+        (OPM, 0x07, "vredmax", "red"),
+        (OPM, 0x0E, "vslide1up", "op"),
+        (OPM, 0x0F, "vslide1down", "op"),
+        (OPM, 0x17, "vcompress", "mask"),
+        (OPM, 0x18, "vmandnot", "mm"),
+        (OPM, 0x19, "vmand", "mm"),
+        (OPM, 0x1A, "vmor", "mm"),
+        (OPM, 0x1B, "vmxor", "mm"),
+        (OPM, 0x1C, "vmornot", "mm"),
+        (OPM, 0x1D, "vmnand", "mm"),
+        (OPM, 0x1E, "vmnor", "mm"),
+        (OPM, 0x1F, "vmxnor", "mm"),
+        (OPM, 0x20, "vdivu", "op"),
+        (OPM, 0x21, "vdiv", "op"),
+        (OPM, 0x22, "vremu", "op"),
+        (OPM, 0x23, "vrem", "op"),
+        (OPM, 0x24, "vmulhu", "op"),
+        (OPM, 0x25, "vmul", "op"),
+        (OPM, 0x26, "vmulhsu", "op"),
+        (OPM, 0x27, "vmulh", "op"),
+        (OPM, 0x29, "vmadd", "fma"),
+        (OPM, 0x2B, "vnmsub", "fma"),
+        (OPM, 0x2D, "vmacc", "fma"),
+        (OPM, 0x2F, "vnmsac", "fma"),
+        (OPM, 0x30, "vwaddu", "op"),
+        (OPM, 0x31, "vwadd", "op"),
+        (OPM, 0x32, "vwsubu", "op"),
+        (OPM, 0x33, "vwsub", "op"),
+        (OPM, 0x34, "vwaddu.w", "widen"),
+        (OPM, 0x35, "vwadd.w", "widen"),
+        (OPM, 0x36, "vwsubu.w", "widen"),
+        (OPM, 0x37, "vwsub.w", "widen"),
+        (OPM, 0x38, "vwmulu", "op"),
+        (OPM, 0x3A, "vwmulsu", "op"),
+        (OPM, 0x3B, "vwmul", "op"),
+        (OPM, 0x3C, "vwmaccu", "fma"),
+        (OPM, 0x3D, "vwmacc", "fma"),
+        (OPM, 0x3E, "vwmaccus", "fma"),
+        (OPM, 0x3F, "vwmaccsu", "fma"),
+        (OPF, 0x00, "vfadd", "op"),
+        (OPF, 0x01, "vfredsum", "red"),
+        (OPF, 0x02, "vfsub", "op"),
+        (OPF, 0x03, "vfredosum", "red"),
+        (OPF, 0x04, "vfmin", "op"),
+        (OPF, 0x05, "vfredmin", "red"),
+        (OPF, 0x06, "vfmax", "op"),
+        (OPF, 0x07, "vfredmax", "red"),
+        (OPF, 0x08, "vfsgnj", "op"),
+        (OPF, 0x09, "vfsgnjn", "op"),
+        (OPF, 0x0A, "vfsgnjx", "op"),
+        (OPF, 0x18, "vmfeq", "op"),
+        (OPF, 0x19, "vmfle", "op"),
+        (OPF, 0x1B, "vmflt", "op"),
+        (OPF, 0x1C, "vmfne", "op"),
+        (OPF, 0x1D, "vmfgt", "op"),
+        (OPF, 0x1F, "vmfge", "op"),
+        (OPF, 0x20, "vfdiv", "op"),
+        (OPF, 0x21, "vfrdiv", "op"),
+        (OPF, 0x24, "vfmul", "op"),
+        (OPF, 0x27, "vfrsub", "op"),
+        (OPF, 0x28, "vfmadd", "fma"),
+        (OPF, 0x29, "vfnmadd", "fma"),
+        (OPF, 0x2A, "vfmsub", "fma"),
+        (OPF, 0x2B, "vfnmsub", "fma"),
+        (OPF, 0x2C, "vfmacc", "fma"),
+        (OPF, 0x2D, "vfnmacc", "fma"),
+        (OPF, 0x2E, "vfmsac", "fma"),
+        (OPF, 0x2F, "vfnmsac", "fma"),
+        (OPF, 0x30, "vfwadd", "op"),
+        (OPF, 0x31, "vfwredsum", "red"),
+        (OPF, 0x32, "vfwsub", "op"),
+        (OPF, 0x33, "vfwredosum", "red"),
+        (OPF, 0x34, "vfwadd.w", "widen"),
+        (OPF, 0x36, "vfwsub.w", "widen"),
+        (OPF, 0x38, "vfwmul", "op"),
+        (OPF, 0x39, "vfdot", "op"),
+        (OPF, 0x3C, "vfwmacc", "fma"),
+        (OPF, 0x3D, "vfwnmacc", "fma"),
+        (OPF, 0x3E, "vfwmsac", "fma"),
+        (OPF, 0x3F, "vfwnmsac", "fma"),
+    )
+
+    # funct6 values where another field picks the instruction, as
+    # (funct3s, funct6, (shift, mask) of that field, {value: (name, operand variant)})
+    opVFieldEncodings = (
+        (OPI, 0x17, (25, 0b1), {0: ("vmerge", "carry"), 1: ("vmv", "mv")}),
+        (OPF, 0x17, (25, 0b1), {0: ("vfmerge.vfm", "merge"), 1: ("vfmv.v.f", "move")}),
+        (
+            (0b010,),
+            0x10,
+            (15, 0x1F),
+            {
+                0x00: ("vmv.x.s", "toscalar"),
+                0x10: ("vpopc.m", "toscalar_m"),
+                0x11: ("vfirst.m", "toscalar_m"),
+            },
+        ),
+        ((0b110,), 0x10, (20, 0x1F), {0x00: ("vmv.s.x", "move")}),
+        ((0b001,), 0x10, (15, 0x1F), {0x00: ("vfmv.f.s", "toscalar")}),
+        ((0b101,), 0x10, (20, 0x1F), {0x00: ("vfmv.s.f", "move")}),
+        (
+            OPM,
+            0x14,
+            (15, 0x1F),
+            {
+                0x01: ("vmsbf.m", "unary"),
+                0x02: ("vmsof.m", "unary"),
+                0x03: ("vmsif.m", "unary"),
+                0x10: ("viota.m", "unary"),
+                0x11: ("vid.v", "nullary"),
+            },
+        ),
+        (
+            OPF,
+            0x22,
+            (15, 0x1F),
+            {
+                0x00: ("vfcvt.xu.f.v", "unary"),
+                0x01: ("vfcvt.x.f.v", "unary"),
+                0x02: ("vfcvt.f.xu.v", "unary"),
+                0x03: ("vfcvt.f.x.v", "unary"),
+                0x08: ("vfwcvt.xu.f.v", "unary"),
+                0x09: ("vfwcvt.x.f.v", "unary"),
+                0x0A: ("vfwcvt.f.xu.v", "unary"),
+                0x0B: ("vfwcvt.f.x.v", "unary"),
+                0x0C: ("vfwcvt.f.f.v", "unary"),
+                0x10: ("vfncvt.xu.f.v", "unary"),
+                0x11: ("vfncvt.x.f.v", "unary"),
+                0x12: ("vfncvt.f.xu.v", "unary"),
+                0x13: ("vfncvt.f.x.v", "unary"),
+                0x14: ("vfncvt.f.f.v", "unary"),
+            },
+        ),
+        (
+            OPF,
+            0x23,
+            (15, 0x1F),
+            {0x00: ("vfsqrt.v", "unary"), 0x10: ("vfclass.v", "unary")},
+        ),
+    )
+
+    @staticmethod
+    def compileOpV(encodings, fieldEncodings, variants):
+        """Builds the OP-V decode table
+        Returns a dictionary of (funct3, funct6) --> (mnemonic, flags, masks),
+        or a DecodeNode over the field that picks the instruction"""
+
+        def row(funct3, name, variant):
+            suffix, flags, masks = variants[variant]
+            if type(suffix) is dict:
+                suffix = suffix[funct3]
+            return (name + suffix, flags, masks)
+
+        table = {}
+        for funct3s, funct6, name, variant in encodings:
+            for funct3 in funct3s:
+                table[funct3, funct6] = row(funct3, name, variant)
+        for funct3s, funct6, (shift, fieldMask), choices in fieldEncodings:
+            for funct3 in funct3s:
+                table[funct3, funct6] = DecodeNode(
+                    shift,
+                    fieldMask,
+                    {
+                        value: row(funct3, name, variant)
+                        for value, (name, variant) in choices.items()
+                    },
+                )
+        return table
+
+    opVTable = compileOpV.__func__(opVEncodings, opVFieldEncodings, opVVariants)
+
+    @staticmethod
+    def OP_V_int(word):
+        """Creates OP-V Instructions from an int, the operands are laid out
+        by funct3 (see opVFormats) and the flags of the opVTable entry
+        Returns None for reserved encodings"""
+        f3 = fp.getFunct3_int(word)
+        if f3 == 0b111:
+            return V32.VSETVL_int(word)
+
+        entry = V32.opVTable.get((f3, word >> 26))
+        if type(entry) is DecodeNode:
+            entry = entry.children.get(word >> entry.shift & entry.mask)
+        if entry is None:
+            return None
+
+        name, flags, masks = entry
+        rv_format, vs1Kind, honoured = V32.opVFormats[f3]
+        flags &= honoured
+
+        # register ids, vector registers come after the 32 integer registers
+        vs1 = fp.getRS1_int(word)
+        immediates = ()
+        if vs1Kind == "v":
+            first = (32 + vs1,)
+        elif vs1Kind == "x":
+            first = (vs1,)
+        else:
+            first = ()
+            immediates = (fp.twos_compliment(vs1, 5),)
+
+        vs2 = 32 + fp.getRS2_int(word)
+        if flags & V32.NO_SRC:
+            src_ids = ()
+        elif flags & V32.NO_VS1:
+            src_ids = (vs2,)
+        elif flags & V32.NO_VS2:
+            src_ids = first
+        elif flags & V32.SWAP:
+            src_ids = (vs2,) + first
+        else:
+            src_ids = first + (vs2,)
+
+        if flags & V32.RD:
+            dest_ids = (fp.getRD_int(word),)
+        else:
+            dest_ids = (32 + fp.getRD_int(word),)
+
+        return RVInstruction.fromIds(
+            rv_format,
+            name,
+            32,
+            word,
+            src_ids,
+            dest_ids,
+            immediates,
+            masks[word >> 25 & 1],
+        )
+
+    # vsetvli zimm fields, indexed by value
+    vsew = ("e8", "e16", "e32", "e64", "e128", None, None, None)
+    vlmul = (None, "m2", "m4", "m8")
+    vediv = (None, "d2", "d4", "d8")
+
+    @staticmethod
+    def VSETVL_int(word):
+        """Creates vsetvli and vsetvl Instructions from an int"""
+        rd = fp.getRD_int(word)
+        rs1 = fp.getRS1_int(word)
+        if word >> 31:
+            return RVInstruction.fromIds(
+                "vsetvl", "vsetvl", 32, word, (rs1, fp.getRS2_int(word)), (rd,)
+            )
+
+        settings = (
+            V32.vsew[word >> 22 & 0b111],
+            V32.vlmul[word >> 20 & 0b11],
+            V32.vediv[word >> 25 & 0b11],
+        )
+        return RVInstruction.fromIds(
+            "vsetvli",
+            "vsetvli",
+            32,
+            word,
+            (rs1,),
+            (rd,),
+            tuple(x for x in settings if x),
+        )
+
     # dictionary of opcodes --> functions(bitarray) --> RVInstruction
     instructionTable = {
         frozenbitarray("0000111"): LOAD_FP.__func__,
@@ -1358,3 +1739,52 @@ class V32:
         frozenbitarray("0101111"): AMO.__func__,
         frozenbitarray("1010111"): OP_V.__func__,
     }
+
+    # dictionary of int opcodes --> functions(int) --> RVInstruction,
+    # the loads, stores and AMOs are only decoded from bitarrays
+    intInstructionTable = {
+        0b1010111: OP_V_int.__func__,
+    }
+
+    instructionNameSet = (
+        {entry[0] for entry in opVTable.values() if type(entry) is not DecodeNode}
+        | {
+            choice[0]
+            for entry in opVTable.values()
+            if type(entry) is DecodeNode
+            for choice in entry.children.values()
+        }
+        | {"vsetvli", "vsetvl"}
+        | {
+            op + nf + width + sign + ff + ".v"
+            for op, ff in (("vl", ""), ("vl", "ff"), ("vls", ""), ("vlx", ""))
+            for nf in ("", "seg2", "seg3", "seg4", "seg5", "seg6", "seg7", "seg8")
+            for width in "bhwe"
+            for sign in ("", "u")
+            if not (width == "e" and sign)
+        }
+        | {
+            op + nf + width + ".v"
+            for op in ("vs", "vss", "vsx", "vsux")
+            for nf in ("", "seg2", "seg3", "seg4", "seg5", "seg6", "seg7", "seg8")
+            for width in "bhwe"
+        }
+        | {
+            op + width
+            for op in (
+                "vamoadd",
+                "vamoswap",
+                "vamoxor",
+                "vamoor",
+                "vamoand",
+                "vamomin",
+                "vamomax",
+                "vamominu",
+                "vamomaxu",
+            )
+            for width in ("w.v", "e.v")
+        }
+    )
+
+    # Registers used in this isa
+    registerSet = {"v{}".format(i) for i in range(32)}
@@ -3,6 +3,8 @@ __version__ = "0.8.0"
 
 from .RVFormatParser import RVFormatParser
 from .RVInstruction import RVInstruction
+from .LazyRVInstruction import LazyRVInstruction
+from .RVEncoding import RVEncoding
 from .BasicBlock import BasicBlock
 from .C32 import C32
 from .I32 import I32
@@ -11,10 +13,14 @@ from .V32 import V32
 from .RV32 import RV32
 from .Histogram import Histogram
 from .Program import Program
+from .ProgramCache import ProgramCache
 from .Subgraph import Subgraph
 
 from .main import main
 from .unused import unused
 from .newop import newop
+from .benchmark import benchmark
+from .convert import convert
+from .live import live
 
 from . import analysis
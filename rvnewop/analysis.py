@@ -1,5 +1,7 @@
 import networkx as nx
 
+from .Subgraph import Subgraph
+
 
 def isCandidate(prog, node, dag):
     """Returns whether node and everything from it makes a feasible candidate subgraph,
@@ -100,6 +102,32 @@ def findCandidateSubgraphs(prog, dag):
     return [n for n in dag if isCandidate(prog, n, dag)]
 
 
+def findProgramCandidates(prog):
+    """Searches the DAG of every sub-block of a program for candidate subgraphs
+    returns a dictionary of sub-block name --> list of candidate Subgraphs
+
+    note: MUST be called after findBasicBlocks and addLivenessValuesToGraph"""
+    candidates = {}
+    for sub_block in prog.getSubBlocks():
+        dag = sub_block.getDAG()
+        candidates[sub_block.name] = [
+            Subgraph(createSubtreeFromNode(dag, n), n)
+            for n in findCandidateSubgraphs(prog, dag)
+        ]
+    return candidates
+
+
+def bestCandidates(candidates, count=None):
+    """Returns the highest scoring candidate of each sub-block, best first,
+    candidates is a dictionary of sub-block name --> list of Subgraphs"""
+    best = [
+        max(subgraphs, key=lambda sg: sg.score)
+        for subgraphs in candidates.values()
+        if subgraphs
+    ]
+    return sorted(best, key=lambda sg: sg.score, reverse=True)[:count]
+
+
 def stringToNum(string):
     """Helper function for hash function"""
     return sum(bytearray(string, "utf-8"))
@@ -0,0 +1,280 @@
+import argparse
+import string
+import time
+
+from .I32 import I32
+from .M32 import M32
+from .RV32 import RV32
+
+# extension --> isa used to decode its words
+extensionISAs = {"I": "32I", "M": "32IM", "C": "32IC", "V": "32IV"}
+
+# the decode paths timed, the reference is RV32.decodeHexBitarray
+paths = ("reference", "hex", "int", "lazy", "table", "batch")
+
+# operand bits filled in by the sweep, on top of each encoding
+sweepPatterns = (0x00000000, 0xFFFFFFFF, 0x55555555, 0xAAAAAAAA, 0x12345678)
+
+
+def dumpFileWords(filename):
+    """Returns the instruction words listed in an objdump file as ints"""
+    words = []
+    with open(filename, "r") as f:
+        for line in f:
+            fields = line.split()
+            if len(fields) > 2 and fields[0].endswith(":"):
+                if all(c in string.hexdigits for c in fields[0][:-1]):
+                    words.append(int(fields[1], 16))
+    return words
+
+
+def extensionOf(word):
+    """Returns which extension (I, M, C or V) decodes an instruction word"""
+    if word & 0b11 != 0b11:
+        return "C"
+    opcode = word & 0x7F
+    if opcode in (0b0000111, 0b0100111, 0b0101111, 0b1010111):
+        return "V"
+    if opcode == 0b0110011 and word >> 25 == 0b0000001:
+        return "M"
+    return "I"
+
+
+def sweepWords():
+    """Returns a dictionary of extension --> instruction words covering every
+    encoding the decoders know, each with a few operand patterns"""
+    words = {
+        "I": [
+            match | pattern & ~mask & 0xFFFFFFFF
+            for name, match, mask, operands in I32.encodings
+            for pattern in sweepPatterns
+        ],
+        "M": [
+            match | pattern & ~mask & 0xFFFFFFFF
+            for name, match, mask, operands in M32.encodings
+            for pattern in sweepPatterns
+        ],
+        # every 16bit word
+        "C": [word for word in range(0x10000) if word & 0b11 != 0b11],
+        "V": [],
+    }
+
+    # OP-V over every funct6, vm and funct3, vector loads, stores and AMOs
+    # over every mop, nf and vm, registers taken from the patterns
+    for opcode in (0b0000111, 0b0100111, 0b0101111, 0b1010111):
+        for top in range(0x80):
+            for funct3 in range(8):
+                for pattern in sweepPatterns:
+                    words["V"].append(
+                        top << 25 | pattern & 0x01FF8F80 | funct3 << 12 | opcode
+                    )
+    return words
+
+
+def corpusWords(filenames):
+    """Returns a dictionary of extension --> the instruction words in
+    objdump files"""
+    words = {extension: [] for extension in extensionISAs}
+    for filename in filenames:
+        for word in dumpFileWords(filename):
+            words[extensionOf(word)].append(word)
+    return words
+
+
+def describe(inst):
+    """Returns the decoded fields of an instruction"""
+    if inst is None:
+        return None
+    return (
+        inst.name,
+        inst.format,
+        inst.size,
+        inst.src_registers,
+        inst.dest_registers,
+        inst.immediates,
+        inst.mask,
+    )
+
+
+def decodeAll(decode, items):
+    """Decodes every item, skipping the ones that raise"""
+    for item in items:
+        try:
+            decode(item)
+        except Exception:
+            pass
+
+
+def decoders(isa):
+    """Returns a dictionary of path --> (function decoding a list of words,
+    True if it takes the words as hex strings rather than ints),
+    none of them cache decodes"""
+    rv = RV32(isa, cache=False)
+    lazy = RV32(isa, cache=False, lazy=True)
+    table = RV32(isa, cache=False, compressedTable=True)
+    return {
+        "reference": (lambda words: decodeAll(rv.decodeHexBitarray, words), True),
+        "hex": (lambda words: decodeAll(rv.decodeHex, words), True),
+        "int": (lambda words: decodeAll(rv.decodeInt, words), False),
+        "lazy": (lambda words: decodeAll(lazy.decodeInt, words), False),
+        "table": (lambda words: decodeAll(table.decodeInt, words), False),
+        "batch": (rv.decodeMany, False),
+    }
+
+
+def decodesPerSecond(decode, words, repeat=3):
+    """Returns how many words decode(words) gets through a second,
+    the best of repeat runs"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        decode(words)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(words) / best if best else float("inf")
+
+
+def conformance(isa, words):
+    """Checks every decode path against the reference decoder
+
+    Words the reference decoder raises on are left out, the fast paths return
+    None for the reserved encodings it can't decode. The encoding tables are
+    stricter than the reference decoder, words it decodes that a path
+    rejects are kept apart from the ones decoded differently
+    Returns (mismatches, rejected), dictionaries of path --> list of
+    (word, expected, got)"""
+    rv = RV32(isa, cache=False)
+    lazy = RV32(isa, cache=False, lazy=True)
+    table = RV32(isa, cache=False, compressedTable=True)
+    fastPaths = {
+        "hex": lambda word: rv.decodeHex(hex(word)),
+        "int": rv.decodeInt,
+        "lazy": lazy.decodeInt,
+        "table": table.decodeInt,
+    }
+
+    mismatches = {path: [] for path in list(fastPaths) + ["batch"]}
+    rejected = {path: [] for path in mismatches}
+    checked = []
+    for word in words:
+        try:
+            expected = rv.decodeHexBitarray(hex(word))
+        except Exception:
+            continue
+        checked.append((word, expected))
+
+        for path, decode in fastPaths.items():
+            try:
+                got = describe(decode(word))
+            except Exception as e:
+                got = type(e)
+            if got == describe(expected):
+                continue
+            if got is None:
+                rejected[path].append((word, describe(expected), got))
+            else:
+                mismatches[path].append((word, describe(expected), got))
+
+    columns = rv.decodeMany([word for word, expected in checked])
+    for i, (word, expected) in enumerate(checked):
+        if expected is None:
+            want = (-1, -1, -1, -1, 0)
+        else:
+            registers = list(expected.dest_ids) + [-1]
+            sources = list(expected.src_ids) + [-1, -1]
+            immediates = expected.immediates
+            want = (
+                RV32.mnemonicId(expected.name),
+                registers[0],
+                sources[0],
+                sources[1],
+                immediates[0] if immediates and isinstance(immediates[0], int) else 0,
+            )
+        got = tuple(
+            int(columns[column][i])
+            for column in ("mnemonic", "rd", "rs1", "rs2", "imm")
+        )
+        if got[0] == -1 and want[0] != -1:
+            rejected["batch"].append((word, want, got))
+        elif got != want:
+            mismatches["batch"].append((word, want, got))
+    return mismatches, rejected
+
+
+def benchmark():
+    parser = argparse.ArgumentParser(
+        description="Measure and cross check the RISC-V decoders"
+    )
+    parser.add_argument(
+        "filenames", type=str, nargs="*", help="objdump files to decode"
+    )
+    parser.add_argument(
+        "--no-sweep",
+        dest="sweep",
+        action="store_false",
+        help="leave out the synthetic sweep over every encoding",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="timed runs per path, the best one is reported",
+    )
+    parser.add_argument(
+        "--check-only",
+        dest="timing",
+        action="store_false",
+        help="only check the fast paths against the reference decoder",
+    )
+
+    args = parser.parse_args()
+
+    words = corpusWords(args.filenames)
+    if args.sweep:
+        for extension, swept in sweepWords().items():
+            words[extension] += swept
+
+    words = {extension: words[extension] for extension in words if words[extension]}
+
+    if args.timing:
+        print("decodes per second")
+        print("{:<4}{:>8}".format("ext", "words"), end="")
+        print("".join("{:>11}".format(path) for path in paths))
+        for extension, isa in extensionISAs.items():
+            if extension not in words:
+                continue
+            hexWords = [hex(word) for word in words[extension]]
+            print("{:<4}{:>8}".format(extension, len(words[extension])), end="")
+            for path, (decode, takesHex) in decoders(isa).items():
+                rate = decodesPerSecond(
+                    decode, hexWords if takesHex else words[extension], args.repeat
+                )
+                print("{:>11.0f}".format(rate), end="", flush=True)
+            print()
+
+    failed = False
+    for extension, isa in extensionISAs.items():
+        if extension not in words:
+            continue
+        mismatches, rejected = conformance(isa, words[extension])
+        for path in mismatches:
+            if rejected[path]:
+                print(
+                    "{} {}: {} words the reference decodes are rejected "
+                    "as reserved encodings, ex: {:#010x}".format(
+                        extension, path, len(rejected[path]), rejected[path][0][0]
+                    )
+                )
+            if mismatches[path]:
+                failed = True
+                print(
+                    "{} {}: {} words differ from the reference decoder".format(
+                        extension, path, len(mismatches[path])
+                    )
+                )
+                for word, expected, got in mismatches[path][:5]:
+                    print("    {:#010x} expected {} got {}".format(word, expected, got))
+
+    if not failed:
+        print("all decode paths agree with the reference decoder")
+    return 1 if failed else 0
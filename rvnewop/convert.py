@@ -0,0 +1,34 @@
+import argparse
+from os import path
+
+from .Histogram import Histogram
+
+
+def binaryFilename(filename):
+    """Returns the name of the .hstb file a histogram is converted into,
+    ex: foo.hst.gz --> foo.hstb"""
+    name, suffix = path.splitext(filename)
+    if suffix in Histogram.compressedSuffixes:
+        name = path.splitext(name)[0]
+    return name + ".hstb"
+
+
+def convert():
+    parser = argparse.ArgumentParser(
+        description="Convert .hst histograms into .hstb binary histograms"
+    )
+    parser.add_argument("filenames", type=str, nargs="+", help=".hst files to convert")
+    parser.add_argument(
+        "--isa",
+        type=str,
+        dest="isa",
+        default="",
+        help="ISA recorded in the .hstb files, ex: 32IMC",
+    )
+
+    args = parser.parse_args()
+
+    for filename in args.filenames:
+        binary = binaryFilename(filename)
+        Histogram.convert(filename, binary, args.isa)
+        print("{} --> {}".format(filename, binary))
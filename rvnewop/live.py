@@ -0,0 +1,127 @@
+import argparse
+import sys
+import time
+
+from . import analysis
+from .Program import Program
+
+
+def readRecord(line):
+    """Returns the (pc, word, freq) record on a histogram line,
+    or None for header and blank lines"""
+    values = line.split()
+    if len(values) != 3:
+        return None
+    try:
+        return int(values[0], 16), int(values[1], 16), int(values[2])
+    except ValueError:
+        return None
+
+
+def live():
+    parser = argparse.ArgumentParser(
+        description="Recommend new RISC-V Instructions from a histogram as it is written"
+    )
+    parser.add_argument(
+        "source",
+        type=str,
+        nargs="?",
+        default="-",
+        help="FIFO or file the histogram is read from, stdin by default",
+    )
+    parser.add_argument(
+        "--isa",
+        type=str,
+        dest="isa",
+        required=True,
+        help="which ISA and extensions to use, ex: 32IMCV",
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=5.0,
+        help="seconds between updates of the recommendations",
+    )
+    parser.add_argument(
+        "--top", type=int, default=10, help="how many candidates are shown"
+    )
+    parser.add_argument(
+        "--stable",
+        type=int,
+        default=0,
+        help="stop once the top candidates are unchanged for this many updates",
+    )
+
+    args = parser.parse_args()
+
+    program = Program(name=args.source, isa=args.isa, lazy=True)
+    # pc --> (word, freq) of every record read, frequencies of PCs seen
+    # again add up
+    totals = {}
+    # pc --> freq, of the PCs the program has a stale frequency for
+    changed = {}
+    rebuild = False
+    candidates = {}
+    records = 0
+    top, stable = None, 0
+
+    def update():
+        nonlocal candidates, rebuild
+        if rebuild:
+            # new PCs, the basic blocks have to be found again
+            program.frequencies.update(changed)
+            program.findBasicBlocks()
+            program.addLivenessValuesToGraph()
+            candidates = analysis.findProgramCandidates(program)
+            rebuild = False
+        elif changed:
+            dirty = program.updateFrequencies(
+                (pc, totals[pc][0], freq) for pc, freq in changed.items()
+            )
+            for name in dirty:
+                for sg in candidates[name]:
+                    sg.updateScore()
+        changed.clear()
+        program.dirtyBlocks.clear()
+
+        best = analysis.bestCandidates(candidates, args.top)
+        print(
+            "{} records, {} instructions, {} executed".format(
+                records, len(program.instructions), program.getTotalInstructionCount()
+            )
+        )
+        for sg in best:
+            print("{:>14} {}".format(sg.score, analysis.graphToParenString(sg.graph)))
+        sys.stdout.flush()
+        return [(sg.graph.graph["sub_block"], sg.root) for sg in best]
+
+    infile = sys.stdin if args.source == "-" else open(args.source)
+    last = time.monotonic()
+    with infile:
+        for line in infile:
+            record = readRecord(line)
+            if record is None:
+                continue
+            records += 1
+            pc, word, freq = record
+
+            if pc in totals and totals[pc][0] == word:
+                freq += totals[pc][1]
+                if pc in program.instructions:
+                    changed[pc] = freq
+            else:
+                program.addInstructionWord(pc, word, freq)
+                rebuild = True
+            totals[pc] = (word, freq)
+
+            if time.monotonic() - last >= args.interval:
+                last = time.monotonic()
+                current = update()
+                stable = stable + 1 if current == top else 0
+                top = current
+                if args.stable and stable >= args.stable:
+                    print("the top candidates are stable, stopping")
+                    return 0
+
+    update()
+    return 0
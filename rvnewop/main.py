@@ -5,7 +5,11 @@ from .Histogram import Histogram
 
 def main():
     parser = argparse.ArgumentParser(description="Disassemble RISC-V Assembly")
-    parser.add_argument("filename", type=str, help="Histogram file to disassemble")
+    parser.add_argument(
+        "filename",
+        type=str,
+        help="Histogram file to disassemble, may be gzip, xz or bz2 compressed",
+    )
     parser.add_argument(
         "--save", dest="savefile", action="store", help="saves output to file"
     )
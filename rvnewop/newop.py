@@ -1,6 +1,4 @@
 import argparse
-from glob import glob
-from os import path
 
 from .Histogram import Histogram
 
@@ -9,18 +7,28 @@ def newop():
     parser = argparse.ArgumentParser(
         description="Find new RISC-V Instructions from a histogram"
     )
-    parser.add_argument("dirname", type=str, help="directory with .hst files in it")
+    parser.add_argument(
+        "dirname",
+        type=str,
+        help="directory with .hst files in it, which may be compressed",
+    )
     parser.add_argument(
         "--isa",
         type=str,
         dest="isa",
         help="which ISA and extensions to use, ex: 32IMCV",
     )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="how many processes parse the files, 0 for one per core",
+    )
 
     args = parser.parse_args()
 
-    files = glob(path.join(args.dirname, "*.hst"))
-    programs = [Histogram.parse(file, isa=args.isa) for file in files]
+    files = Histogram.findFiles(args.dirname)
+    programs = Histogram.parseMany(files, isa=args.isa, jobs=args.jobs or None)
 
     for program in programs:
         program.findBasicBlocks()
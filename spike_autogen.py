@@ -8,6 +8,8 @@ from pathlib import Path
 from bitarray import bitarray
 import sys
 
+from rvnewop import RVEncoding, I32, M32
+
 
 def usage():
     print("Program takes three arguments:")
@@ -16,6 +18,19 @@ def usage():
     print("Path to a backup folder/workspace")
 
 
+def fillMatchMask(insn):
+    """Fills in the match and mask of a JSON instruction from rvnewop's
+    encoding tables, when the JSON does not give them"""
+    if "match" in insn and "mask" in insn:
+        return
+    entry = RVEncoding.find(insn["insn_name"], [I32.encodings, M32.encodings])
+    if entry is None:
+        print("Fatal: No match/mask given for " + insn["insn_name"])
+        sys.exit(1)
+    insn["match"] = "0x{:x}".format(entry[1])
+    insn["mask"] = "0x{:x}".format(entry[2])
+
+
 class AutoGen:
     def __init__(self, new_insn_json, riscv_path_name, backup_path):
         if os.path.exists(riscv_path_name) == False:
@@ -30,6 +45,8 @@ class AutoGen:
 
             # TODO get data from json
             insn_dict = json.load(json_handle)
+            for insn in insn_dict["instructions"]:
+                fillMatchMask(insn)
             # get name of new insn and save in var insn_name
             for i in range(len(insn_dict["instructions"])):
                 insn_name[i] = insn_dict["instructions"][i]["insn_name"]
@@ -0,0 +1,279 @@
+import string
+import os
+import random
+from glob import glob
+from bitarray import util
+from rvnewop import RVFormatParser as fp
+from rvnewop.benchmark import sweepWords, corpusWords, conformance, extensionISAs
+from rvnewop import RV32, C32, I32, M32, RVInstruction, LazyRVInstruction
+
+import pytest
+
+
+def dumpFileWords(file_name):
+    """Returns the instruction hex words listed in an objdump file"""
+    words = []
+    with open(file_name, "r") as df_handle:
+        for line in df_handle:
+            words_in_line = line.split()
+            if len(words_in_line) > 2 and words_in_line[0].endswith(":"):
+                if all(c in string.hexdigits for c in words_in_line[0][:-1]):
+                    words.append(words_in_line[1])
+    return words
+
+
+def describe(decoder, word):
+    """Returns the decoded fields of an instruction, or the exception raised"""
+    try:
+        inst = decoder(word)
+    except Exception as e:
+        return type(e)
+    if inst is None:
+        return None
+    return (
+        str(inst),
+        inst.name,
+        inst.format,
+        inst.size,
+        inst.src_registers,
+        inst.dest_registers,
+        inst.immediates,
+    )
+
+
+def test_decode_int_matches_bitarray():
+    rv = RV32("32IMC")
+    files = glob(os.path.join("tests", "dump_files/*.dump"))
+    for file in files:
+        for word in dumpFileWords(file):
+            assert describe(rv.decodeInt, int(word, 16)) == describe(
+                rv.decodeHexBitarray, word
+            )
+
+
+def test_decode_int_compressed_space():
+    rv = RV32("32IC")
+    for word in range(0x10000):
+        if word & 0b11 == 0b11:
+            continue
+        assert describe(rv.decodeInt, word) == describe(rv.decodeHexBitarray, hex(word))
+
+
+def test_compressed_table():
+    rv = RV32("32IC")
+    rv_table = RV32("32IC", compressedTable=True)
+    for word in range(0x10000):
+        if word & 0b11 == 0b11:
+            continue
+        assert describe(rv_table.decodeInt, word) == describe(rv.decodeInt, word)
+
+
+def test_compressed_table_file(tmp_path):
+    filename = str(tmp_path / "c32.table")
+    C32.decodeTable = None
+    built = RV32("32IC", compressedTable=True, compressedTableFile=filename)
+    assert os.path.exists(filename)
+
+    C32.decodeTable = None
+    loaded = RV32("32IC", compressedTable=True, compressedTableFile=filename)
+    assert loaded.compressedTable is not built.compressedTable
+    for word in range(0, 0x10000, 7):
+        if word & 0b11 == 0b11:
+            continue
+        assert describe(loaded.decodeInt, word) == describe(built.decodeInt, word)
+
+
+def test_decode_cache_shared():
+    RV32.clearDecodeCaches()
+    first = RV32("32IMC")
+    second = RV32("32ICM")
+    assert first.decodeCache is second.decodeCache
+
+    inst = first.decodeHex("00e787b3")
+    assert second.decodeHex("00e787b3") is inst
+    info = second.cacheInfo()
+    assert (info.hits, info.misses) == (1, 1)
+
+    assert RV32("32IMC", cache=False).cacheInfo() is None
+    assert RV32("32I").decodeCache is not first.decodeCache
+
+    # the compressed table decodes through its own memo
+    table = RV32("32IMC", compressedTable=True)
+    assert table.decodeCache is not first.decodeCache
+    assert table.decodeHex("4501") is table.compressedTable[0x4501]
+
+
+def test_decode_many():
+    rv = RV32("32IMC")
+    words = []
+    for file in glob(os.path.join("tests", "dump_files/*.dump")):
+        words += [int(word, 16) for word in dumpFileWords(file)]
+
+    columns = rv.decodeMany(words)
+    for i, word in enumerate(words):
+        assert columns["size"][i] == (4 if word & 0b11 == 0b11 else 2)
+        try:
+            inst = rv.decodeInt(word)
+        except Exception:
+            inst = None
+        if inst is None:
+            assert columns["mnemonic"][i] == -1
+            continue
+
+        assert RV32.mnemonics[columns["mnemonic"][i]] == inst.name
+        rd = columns["rd"][i]
+        assert inst.dest_registers[:1] == (
+            [RVInstruction.registerName(rd)] if rd >= 0 else []
+        )
+        sources = [
+            RVInstruction.registerName(r)
+            for r in (columns["rs1"][i], columns["rs2"][i])
+            if r >= 0
+        ]
+        assert inst.src_registers[:2] == sources
+        assert columns["imm"][i] == (inst.immediates[0] if inst.immediates else 0)
+
+
+def test_int_parsers():
+    def number(register):
+        return int(register[1:])
+
+    random.seed(0)
+    for _ in range(2000):
+        word = random.getrandbits(32)
+        ba = util.int2ba(word, 32)
+        data = fp.parseR(ba)
+        assert fp.parseR_int(word) == tuple(
+            number(data[x]) for x in ("rd", "rs1", "rs2")
+        )
+        data = fp.parseI(ba)
+        assert fp.parseI_int(word) == (
+            number(data["rd"]),
+            number(data["rs1"]),
+            data["imm"],
+        )
+        for parse, parse_int in (
+            (fp.parseS, fp.parseS_int),
+            (fp.parseB, fp.parseB_int),
+        ):
+            data = parse(ba)
+            assert parse_int(word) == (
+                number(data["rs1"]),
+                number(data["rs2"]),
+                data["imm"],
+            )
+        for parse, parse_int in (
+            (fp.parseU, fp.parseU_int),
+            (fp.parseJ, fp.parseJ_int),
+        ):
+            data = parse(ba)
+            assert parse_int(word) == (number(data["rd"]), data["imm"])
+
+
+def test_encodings():
+    rv = RV32("32IM")
+    for name, match, mask, operands in I32.encodings + M32.encodings:
+        inst = rv.decodeInt(match)
+        assert inst.name == (name if operands else "unsupported")
+        assert describe(rv.decodeInt, match) == describe(
+            rv.decodeHexBitarray, hex(match)
+        )
+
+    # mul shares its opcode and funct3 with add
+    assert rv.decodeHex("02f707b3").name == "mul"
+    assert RV32("32I").decodeHex("02f707b3") is None
+
+
+def test_dispatch():
+    rv = RV32("32IM")
+    shared = rv.intInstructionTable[0b0110011]
+    assert sorted(shared) == [0b0000000, 0b0000001, 0b0100000]
+    assert rv.decodeHexBitarray("02f707b3").name == "mul"
+    assert rv.decodeHex("0af707b3") is None
+
+    extensions = [
+        ("I", M32.instructionTable, {0b0110011: None}, {0b0110011: {0, 1}}),
+        ("M", M32.instructionTable, {0b0110011: None}, {0b0110011: {1}}),
+    ]
+    with pytest.raises(ValueError):
+        RV32.dispatch(extensions)
+
+
+def test_compact_instruction():
+    inst = RV32("32I", cache=False).decodeHex("00e787b3")
+    assert (inst.src_ids, inst.dest_ids) == ((15, 14), (15,))
+    assert inst.src_registers == ["x15", "x14"]
+    assert inst.binary == 0x00E787B3
+    assert RV32("32IM", cache=False).decodeHex("00e787b3") is inst
+
+    inst = RVInstruction(rv_src_registers=["x1", "v2"], rv_immediates=[4])
+    inst.dest_registers = ["x3"]
+    assert (inst.src_ids, inst.dest_ids) == ((1, 34), (3,))
+    assert str(inst) == "gp,ra,v2,4"
+    assert not hasattr(inst, "__dict__")
+    # counts are kept by the Program, per PC
+    assert not hasattr(inst, "freq")
+
+    RV32.clearDecodeCaches()
+    assert len(RVInstruction.flyweights) == 0
+    inst = RV32("32I").decodeHex("00e787b3")
+    assert list(RVInstruction.flyweights.values()) == [inst]
+    RV32.clearDecodeCaches()
+    del inst
+    assert len(RVInstruction.flyweights) == 0
+
+
+def test_lazy_decode():
+    rv = RV32("32IMC")
+    lazy = RV32("32IMC", lazy=True)
+    files = glob(os.path.join("tests", "dump_files/*.dump"))
+    for word in dumpFileWords(files[0]):
+        assert describe(lazy.decodeHex, word) == describe(rv.decodeHex, word)
+        try:
+            inst = rv.decodeHex(word)
+        except Exception:
+            continue
+        if inst is not None:
+            assert lazy.decodeHex(word).flags == inst.flags
+
+    inst = RV32("32I", cache=False, lazy=True).decodeHex("00e787b3")
+    assert type(inst) is LazyRVInstruction
+    inst.src_registers = ["x1", "x2"]
+    assert inst.dest_registers == ["x15"]
+    assert inst.src_registers == ["x1", "x2"]
+
+
+def test_vector_table():
+    rv = RV32("32IV")
+    for funct3 in range(8):
+        for funct6 in range(64):
+            for vm, vs2, vs1 in ((1, 0, 0), (0, 1, 0x10), (1, 0x11, 0x0B)):
+                word = funct6 << 26 | vm << 25 | vs2 << 20 | vs1 << 15
+                word |= funct3 << 12 | 0b00011 << 7 | 0b1010111
+                expected = describe(rv.decodeHexBitarray, hex(word))
+                if funct6 == 0b010111 and not vm and funct3 in (0b000, 0b011, 0b100):
+                    # OP_V can't decode vmerge, checked below
+                    continue
+                if expected is UnboundLocalError:
+                    # reserved encodings have no table entry
+                    assert rv.decodeInt(word) is None
+                    continue
+                assert describe(rv.decodeInt, word) == expected
+                inst = rv.decodeInt(word)
+                assert inst.mask == rv.decodeHexBitarray(hex(word)).mask
+                assert inst.name in rv.instructionNameSet
+
+    assert rv.decodeHex("5c2081d7").name == "vmerge.vvm"
+    assert rv.decodeHex("5c2081d7").mask == ["v0"]
+    assert "v31" in rv.registerSet
+
+
+def test_conformance():
+    words = sweepWords()
+    corpus = corpusWords(glob(os.path.join("tests", "dump_files/*.dump")))
+    # every 16bit word is already checked above
+    for extension in "IMV":
+        isa = extensionISAs[extension]
+        mismatches, rejected = conformance(isa, words[extension] + corpus[extension])
+        assert not any(mismatches.values())
+        assert not any(rejected.values())
@@ -0,0 +1,218 @@
+import bz2
+import gzip
+import lzma
+import os
+from glob import glob
+from rvnewop import Histogram
+from rvnewop.convert import binaryFilename
+
+import pytest
+
+
+def writeHistogram(path, records, header="bbl loader\n"):
+    """Writes (pc, word, freq) records out as a .hst file"""
+    with open(path, "w") as f:
+        f.write(header)
+        f.write("PC Histogram size:{}\n".format(len(records)))
+        for pc, word, freq in records:
+            f.write("{:x} {:x} {}\n".format(pc, word, freq))
+    return str(path)
+
+
+def test_iter_records(tmp_path):
+    records = [(0x1000, 0x297, 1), (0x1004, 0x00E787B3, 12), (0x1008, 0x8082, 3)]
+    filename = writeHistogram(tmp_path / "small.hst", records)
+    assert list(Histogram.iterRecords(filename)) == records
+
+    program = Histogram.parse(filename, "32IC")
+    assert program.frequencies == {pc: freq for pc, word, freq in records}
+    assert str(program.instructions[0x1004]) == "add a5,a5,a4"
+
+
+def test_iter_records_embench():
+    filename = sorted(glob(os.path.join("embench_hst", "*.hst")))[0]
+    program = Histogram.parse(filename, "32IMC")
+    records = list(Histogram.iterRecords(filename))
+    assert len(records) == len(program.frequencies)
+    for pc, word, freq in records:
+        assert program.frequencies[pc] == freq
+        assert program.instructions[pc] is program.rv.decodeInt(word)
+
+
+def test_parse_arrays(tmp_path):
+    records = [(0x80000000, 0xFFFFFFFF, 10**12), (0x1004, 0x00E787B3, 0), (0xA, 0x1, 7)]
+    # the header undercounts, the arrays still hold every record
+    filename = writeHistogram(tmp_path / "small.hst", records, "bbl loader\r\n")
+    with open(filename, "a") as f:
+        f.write("1010 8082 2\n")
+    arrays = Histogram.parseArrays(filename)
+    assert arrays["word"].dtype == "uint32"
+    assert list(zip(*(arrays[c].tolist() for c in ("pc", "word", "freq")))) == list(
+        Histogram.iterRecords(filename)
+    )
+
+    filename = sorted(glob(os.path.join("embench_hst", "*.hst")))[0]
+    arrays = Histogram.parseArrays(filename)
+    records = list(Histogram.iterRecords(filename))
+    assert arrays["pc"].tolist() == [pc for pc, word, freq in records]
+    assert arrays["word"].tolist() == [word for pc, word, freq in records]
+    assert arrays["freq"].tolist() == [freq for pc, word, freq in records]
+
+    with open(tmp_path / "bad.hst", "w") as f:
+        f.write("PC Histogram size:1\n1000 297 1f\n")
+    with pytest.raises(ValueError):
+        Histogram.parseArrays(str(tmp_path / "bad.hst"))
+    # the fields of a line would slide into the next record
+    for lines in ("1000 297 1 5\n1004 2028593\n", "1000 297 1 1004 2028593 2\n"):
+        with open(tmp_path / "mixed.hst", "w") as f:
+            f.write("PC Histogram size:2\n" + lines)
+        with pytest.raises(ValueError):
+            Histogram.parseArrays(str(tmp_path / "mixed.hst"))
+    with open(tmp_path / "wide.hst", "w") as f:
+        f.write("PC Histogram size:1\n1000 100000297 1\n")
+    with pytest.raises(ValueError):
+        Histogram.parseArrays(str(tmp_path / "wide.hst"))
+
+
+def test_binary_histogram(tmp_path):
+    filename = sorted(glob(os.path.join("embench_hst", "*.hst")))[0]
+    binary = str(tmp_path / "trace.hstb")
+    Histogram.convert(filename, binary, "32IMC")
+    assert Histogram.isBinary(binary) and not Histogram.isBinary(filename)
+
+    header = Histogram.readHeader(binary)
+    arrays = Histogram.parseArrays(filename)
+    assert header["isa"] == "32IMC"
+    assert header["count"] == len(arrays["pc"])
+    assert header["basePC"] == arrays["pc"].min()
+
+    loaded = Histogram.load(binary, verify=True)
+    for column in ("pc", "word", "freq"):
+        assert loaded[column].tolist() == arrays[column].tolist()
+
+    text, program = Histogram.parse(filename, "32IMC"), Histogram.parse(binary, None)
+    assert program.frequencies == text.frequencies
+    assert program.instructions == text.instructions
+
+    with open(binary, "r+b") as f:
+        f.seek(-1, os.SEEK_END)
+        f.write(b"\xff")
+    Histogram.load(binary)
+    with pytest.raises(ValueError):
+        Histogram.load(binary, verify=True)
+
+    assert binaryFilename(os.path.join("a.b", "trace.hst")) == os.path.join(
+        "a.b", "trace.hstb"
+    )
+    assert binaryFilename("trace.hst.gz") == "trace.hstb"
+    assert binaryFilename("trace.hst.xz") == "trace.hstb"
+
+    Histogram.writeBinary(binary, {"pc": [], "word": [], "freq": []})
+    assert len(Histogram.load(binary, verify=True)["pc"]) == 0
+
+
+@pytest.mark.parametrize("module", [gzip, lzma, bz2])
+def test_compressed_histogram(tmp_path, module, monkeypatch):
+    filename = sorted(glob(os.path.join("embench_hst", "*.hst")))[0]
+    compressed = str(tmp_path / "trace.hst.z")
+    with open(filename, "rb") as f, module.open(compressed, "wb") as out:
+        out.write(f.read())
+    assert Histogram.compression(compressed) is module
+    assert Histogram.compression(filename) is None
+
+    assert list(Histogram.iterRecords(compressed)) == list(
+        Histogram.iterRecords(filename)
+    )
+    # small chunks split lines between reads
+    monkeypatch.setattr(Histogram, "chunkSize", 1000)
+    arrays, expected = Histogram.parseArrays(compressed), Histogram.parseArrays(
+        filename
+    )
+    for column in ("pc", "word", "freq"):
+        assert arrays[column].tolist() == expected[column].tolist()
+
+    program = Histogram.parse(compressed, "32IMC")
+    assert program.frequencies == Histogram.parse(filename, "32IMC").frequencies
+    assert Histogram.findFiles(str(tmp_path)) == []
+    os.rename(compressed, str(tmp_path / "trace.hst.xz"))
+    assert Histogram.findFiles(str(tmp_path)) == [str(tmp_path / "trace.hst.xz")]
+
+
+def test_parse_many(tmp_path):
+    filenames = sorted(glob(os.path.join("embench_hst", "*.hst")))[:3]
+    binary = str(tmp_path / "trace.hstb")
+    Histogram.convert(filenames[0], binary, "32IMC")
+    filenames.append(binary)
+
+    programs = Histogram.parseMany(filenames, "32IMC", jobs=2)
+    assert [program.name for program in programs] == filenames
+    for filename, program in zip(filenames, programs):
+        expected = Histogram.parse(filename, "32IMC")
+        assert program.frequencies == expected.frequencies
+        # decoded in the workers, so fully rather than lazily
+        assert {pc: inst.fields() for pc, inst in program.instructions.items()} == {
+            pc: inst.fields() for pc, inst in expected.instructions.items()
+        }
+    # the same words decode into the same shared instructions
+    for pc, inst in programs[0].instructions.items():
+        assert programs[-1].instructions[pc] is inst
+
+
+def test_merge(tmp_path):
+    filename = sorted(glob(os.path.join("embench_hst", "*.hst")))[0]
+    records = list(Histogram.iterRecords(filename))
+    runs = [
+        writeHistogram(tmp_path / "run0.hst", records),
+        writeHistogram(tmp_path / "run1.hst", records[::2]),
+        # the last PC holds a different word in this run
+        writeHistogram(tmp_path / "run2.hst", [(records[-1][0], 1, 5)]),
+    ]
+
+    conflicts = []
+    merged = list(Histogram.merge(runs, conflicts))
+    assert conflicts == [(records[-1][0], sorted([records[-1][1], 1]))]
+    expected = [
+        (pc, word, freq * 2 if i % 2 == 0 else freq)
+        for i, (pc, word, freq) in enumerate(records)
+    ]
+    expected[-1:] = sorted([expected[-1], (records[-1][0], 1, 5)])
+    assert merged == expected
+
+    for name in ("merged.hst", "merged.hstb"):
+        out = str(tmp_path / name)
+        assert Histogram.write(out, Histogram.merge(runs), "32IMC") == len(merged)
+        assert list(Histogram.iterRecords(out)) == merged
+    assert Histogram.load(out, verify=True)["pc"].tolist() == [r[0] for r in merged]
+
+    backwards = writeHistogram(tmp_path / "backwards.hst", records[::-1])
+    with pytest.raises(ValueError):
+        list(Histogram.merge([backwards]))
+
+
+def test_filter_records():
+    filename = os.path.join("embench_hst", "crc32.hst")
+    whole = Histogram.parse(filename, "32IMC", cache=False)
+    whole.findBasicBlocks()
+    total = whole.getTotalInstructionCount()
+
+    hot = Histogram.parse(filename, "32IMC", cache=False, coverage=0.99)
+    assert len(hot.instructions) < len(whole.instructions) / 10
+    assert hot.getTotalInstructionCount() >= 0.99 * total
+
+    # the hot blocks are found just as they are in the whole program
+    hot = Histogram.parse(filename, "32IMC", cache=False, minFreq=100)
+    hot.findBasicBlocks()
+    blocks = {(b.start, b.end, b.frequency) for b in whole.basicBlocks}
+    assert all(
+        (b.start, b.end, b.frequency) in blocks
+        for b in hot.basicBlocks
+        if b.frequency >= 100
+    )
+    # with the cold branches into them
+    assert any(freq < 100 for freq in hot.frequencies.values())
+
+    records = Histogram.parseArrays(filename)
+    start, end = 0x10000, 0x12000
+    kept = Histogram.filterRecords(records, pcRanges=[(start, end)])
+    assert all(start <= pc < end for pc in kept["pc"].tolist())
+    assert len(Histogram.filterRecords(records, minFreq=2**62)["pc"]) == 0
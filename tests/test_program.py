@@ -0,0 +1,246 @@
+import io
+import os
+import struct
+from glob import glob
+from rvnewop import Histogram, Program, ProgramCache, RV32, Subgraph, analysis, live
+from rvnewop.benchmark import dumpFileWords
+
+import pytest
+
+
+def test_update_frequencies(tmp_path):
+    filename = sorted(glob(os.path.join("embench_hst", "*.hst")))[0]
+    program = Histogram.parse(filename, "32IMC")
+    program.findBasicBlocks()
+    program.addLivenessValuesToGraph()
+
+    subgraphs = []
+    for sub_block in program.getSubBlocks():
+        dag = sub_block.getDAG()
+        assert sub_block.getDAG() is dag
+        for node in analysis.findCandidateSubgraphs(program, dag):
+            subgraphs.append(Subgraph(analysis.createSubtreeFromNode(dag, node), node))
+    hot = max(subgraphs, key=lambda subgraph: subgraph.score)
+    block = next(
+        b
+        for b in program.basicBlocks
+        if hot.graph.graph["sub_block"]
+        in [sub_block.name for sub_block in b.sub_blocks]
+    )
+
+    # run the hottest block three times as often
+    records = [
+        (pc, word, freq * 3 if block.start <= pc <= block.end else freq)
+        for pc, word, freq in Histogram.iterRecords(filename)
+    ]
+    score = hot.score
+    dirty = program.updateFrequencies(records)
+    assert dirty == {sub_block.name for sub_block in block.sub_blocks}
+    assert program.dirtyBlocks == dirty
+    for subgraph in subgraphs:
+        if subgraph.graph.graph["sub_block"] in dirty:
+            subgraph.updateScore()
+    assert hot.score == 3 * score
+
+    rerun = str(tmp_path / "rerun.hst")
+    Histogram.write(rerun, records)
+    rebuilt = Histogram.parse(rerun, "32IMC")
+    rebuilt.findBasicBlocks()
+    assert [(b.name, b.frequency) for b in program.basicBlocks] == [
+        (b.name, b.frequency) for b in rebuilt.basicBlocks
+    ]
+    assert program.getTotalInstructionCount() == rebuilt.getTotalInstructionCount()
+
+    pc, word, freq = records[0]
+    with pytest.raises(ValueError):
+        program.updateFrequencies([(pc, word ^ 0x80, freq)])
+
+
+def test_live(tmp_path, monkeypatch, capsys):
+    filename = sorted(glob(os.path.join("embench_hst", "*.hst")))[0]
+    records = list(Histogram.iterRecords(filename))[:120]
+    trace = str(tmp_path / "trace.hst")
+    Histogram.write(trace, records)
+    with open(trace) as f:
+        lines = f.read()
+
+    # the second half only changes frequencies
+    monkeypatch.setattr("sys.stdin", io.StringIO(lines + lines))
+    monkeypatch.setattr(
+        "sys.argv", ["rvnewop-live", "--isa", "32IMC", "--interval", "0", "--top", "5"]
+    )
+    assert live() == 0
+    reports = capsys.readouterr().out.split("records, ")
+    assert len(reports) > len(records)
+
+    doubled = str(tmp_path / "doubled.hst")
+    Histogram.write(doubled, [(pc, word, 2 * freq) for pc, word, freq in records])
+    program = Histogram.parse(doubled, "32IMC")
+    program.findBasicBlocks()
+    program.addLivenessValuesToGraph()
+    best = analysis.bestCandidates(analysis.findProgramCandidates(program), 5)
+    assert best
+    assert reports[-1].splitlines()[1:] == [
+        "{:>14} {}".format(sg.score, analysis.graphToParenString(sg.graph))
+        for sg in best
+    ]
+
+    # the records don't say which ISA they are
+    monkeypatch.setattr("sys.argv", ["rvnewop-live"])
+    with pytest.raises(SystemExit):
+        live()
+
+
+def analyse(program):
+    """Returns the basic blocks, sub-block graph and liveness of a program"""
+    program.findBasicBlocks()
+    program.addLivenessValuesToGraph()
+    return (
+        [(b.name, b.start, b.end, b.frequency) for b in program.basicBlocks],
+        sorted(program.sbGraph.edges),
+        sorted(
+            (name, sorted(data["needs_live"]), sorted(data["kills"]))
+            for name, data in program.sbGraph.nodes(data=True)
+        ),
+    )
+
+
+def test_block_boundaries(monkeypatch):
+    filenames = sorted(glob(os.path.join("embench_hst", "*.hst")))[:3]
+    for filename in filenames + [os.path.join("coremark", "coremark.hst")]:
+        monkeypatch.setattr(Program, "arrayBlocksThreshold", 1 << 62)
+        expected = analyse(Histogram.parse(filename, "32IMC", cache=False))
+        monkeypatch.setattr(Program, "arrayBlocksThreshold", 0)
+        program = Histogram.parse(filename, "32IMC", cache=False)
+        assert analyse(program) == expected
+
+        pcs = program.instructionColumns()["pc"].tolist()
+        starts, ends = Program.blockBoundaries(program.instructionColumns())
+        assert [(pcs[i], pcs[j]) for i, j in zip(starts, ends)] == sorted(
+            (start, end) for name, start, end, freq in expected[0]
+        )
+
+    # overlapping instructions are left to findLeaders
+    program = Program("overlap", "32IMC")
+    program.addInstruction(0x100, "00e787b3", 1)
+    program.addInstruction(0x102, "4501", 1)
+    assert Program.blockBoundaries(program.instructionColumns()) is None
+    program.findBasicBlocks()
+    assert [(b.start, b.end) for b in program.basicBlocks] == [
+        (0x100, 0x100),
+        (0x102, 0x102),
+    ]
+
+
+def test_program_cache(tmp_path, monkeypatch):
+    filename = sorted(glob(os.path.join("embench_hst", "*.hst")))[0]
+    cache = ProgramCache(str(tmp_path / "cache"))
+    expected = analyse(Histogram.parse(filename, "32IMC", cache=False))
+    assert analyse(Histogram.parse(filename, "32IMC", cache=cache)) == expected
+    key = cache.key(filename, "32IMC")
+    assert cache.keys() == [key]
+    assert cache.key(filename, "32IM") != key
+
+    # the second time round nothing is parsed or searched
+    with monkeypatch.context() as m:
+        m.setattr(Histogram, "readRecords", None)
+        m.setattr(Program, "findLeaders", None)
+        m.setattr(Program, "findBasicBlocksArrays", None)
+        m.setattr(Program, "depthFirstTraversalLiveness", None)
+        m.setenv(ProgramCache.environmentVariable, cache.directory)
+        program = Histogram.parse(filename, "32IMC")
+        assert analyse(program) == expected
+
+        # adding instructions leaves the cache behind
+        program.addInstructionWord(0x10, 0x00E787B3, 1)
+        assert program.cache is None
+    assert program.instructions[0x10].name == "add"
+
+    cache.invalidate(key)
+    assert cache.keys() == []
+    Histogram.parse(filename, "32IMC", cache=cache)
+    cache.maxBytes = cache.size() - 1
+    cache.evict()
+    assert cache.keys() == []
+
+    # entries another process removed in the meantime are skipped
+    monkeypatch.setattr(cache, "keys", lambda: [key])
+    assert cache.load(key) is None
+    cache.evict()
+
+
+def writeElf(path, address, code, flags=0x1):
+    """Writes out a minimal little endian ELF32 RISC-V file holding code in
+    its .text section"""
+    names = b"\0.text\0.shstrtab\0"
+    header = struct.pack(
+        "<4sBBBB8sHHIIIIIHHHHHH",
+        b"\x7fELF",
+        1,
+        1,
+        1,
+        0,
+        bytes(8),
+        2,
+        243,
+        1,
+        address,
+        0,
+        52,
+        flags,
+        52,
+        0,
+        0,
+        40,
+        3,
+        2,
+    )
+    codeAt = 52 + 3 * 40
+    sections = bytes(40) + struct.pack(
+        "<IIIIIIIIII", 1, 1, 6, address, codeAt, len(code), 0, 0, 2, 0
+    )
+    sections += struct.pack(
+        "<IIIIIIIIII", 7, 3, 0, 0, codeAt + len(code), len(names), 0, 0, 1, 0
+    )
+    with open(path, "wb") as f:
+        f.write(header + sections + code + names)
+    return str(path)
+
+
+def test_static_programs(tmp_path, monkeypatch, capsys):
+    filename = os.path.join("tests", "dump_files", "sample.dump")
+    program = Program.fromObjdump(filename, "32IMC")
+    words = dumpFileWords(filename)
+    assert len(program.instructions) == len(words)
+    assert set(program.frequencies.values()) == {0}
+    for pc, inst in program.instructions.items():
+        assert inst is program.rv.decodeInt(inst.binary)
+
+    # li a5,0  c.li a0,0  ret
+    code = struct.pack("<IHI", 0x00000793, 0x4501, 0x00008067)
+    elf = Program.fromElf(writeElf(tmp_path / "a.out", 0x10074, code))
+    assert [(pc, str(inst)) for pc, inst in elf.instructions.items()] == [
+        (0x10074, "addi a5,zero,0"),
+        (0x10078, "c.li a0,0"),
+        (0x1007A, "jalr zero,0(ra)"),
+    ]
+    assert elf.rv.extensions == "IMC"
+
+    # join the counts of a run, including code outside the listing
+    for pc, word, freq in [(0x10078, 0x4501, 7), (0x1000, 0x297, 1)]:
+        elf.addInstructionWord(pc, word, freq)
+    assert elf.frequencies == {0x10074: 0, 0x10078: 7, 0x1007A: 0, 0x1000: 1}
+    elf.findBasicBlocks()
+
+    with pytest.raises(ValueError):
+        Program.fromElf(filename)
+
+    # reserved encodings and unknown opcodes in the section are left out
+    # quietly, decoder bugs aren't
+    code = struct.pack("<HHI", 0x6001, 0x4501, 0x0000007F)
+    elf = Program.fromElf(writeElf(tmp_path / "data.out", 0x10074, code))
+    assert list(elf.instructions) == [0x10076]
+    assert capsys.readouterr().out == ""
+    monkeypatch.setattr(RV32, "decodeInt", None)
+    with pytest.raises(TypeError):
+        Program.fromElf(writeElf(tmp_path / "data.out", 0x10074, code))